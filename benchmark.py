@@ -0,0 +1,409 @@
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import bot
+
+# Offline benchmarks of the parsing and pair matching hot paths.
+#
+# Runs on the fixtures in benchmark_fixtures/ (re-record them with --record), synthetic ones for whatever is missing:
+#   benchmark_fixtures/telegram/<exchange>/<page>.html   saved t.me/s/ pages of the channel
+#   benchmark_fixtures/kucoin_announcements/<name>.html  saved kucoin announcement pages
+#   benchmark_fixtures/markets/<exchange>.json           ccxt load_markets() snapshot
+#   benchmark_fixtures/recorded.json                     what --record captured, and when
+# The results label every fixture "recorded" (by --record), "handmade" (any other file) or "synthetic".
+#
+#   python3 benchmark.py --output results.json
+#   python3 benchmark.py --compare results.json   # exits with 1 if anything got slower than --threshold
+
+SIZES = [100, 5000, 20000]
+MESSAGES_PER_PAGE = 20
+
+FIXTURES_DIR = Path("benchmark_fixtures")
+
+
+class FixtureFetcher(bot.HttpPageFetcher):
+    # serves pre-built t.me/s/ pages (newest page first) instead of fetching them
+    def __init__(self, pages):
+        # no session needed, fetch() never goes to the network
+        super().__init__(session=False)
+        self.fixture_pages = pages
+        self.newest_post_ids = [max(int(post_id) for post_id in self.post_id_pattern.findall(page))
+                                for page in pages]
+
+    def fetch(self, url, params=None):
+        page_index = 0
+        if params and "before" in params:
+            page_index = next((index for index, newest_post_id in enumerate(self.newest_post_ids)
+                               if newest_post_id < params["before"]), len(self.fixture_pages))
+        if page_index >= len(self.fixture_pages):
+            return "<html><body></body></html>"
+        return self.fixture_pages[page_index]
+
+
+def load_bubbles(exchange):
+    # the message bubbles of the saved pages of an exchange, None if there are none
+    page_files = sorted((FIXTURES_DIR / "telegram" / exchange).glob("*.html"))
+    if not page_files:
+        return None
+    scraper = bot.SCRAPERS[exchange]()
+    bubbles = []
+    for page_file in page_files:
+        bubbles.extend(str(bubble) for bubble in scraper.extract_new_messages(StaticDriver(page_file.read_text())))
+    return bubbles or None
+
+
+class StaticDriver:
+    # just enough of a driver to run extract_new_messages on a saved page
+    def __init__(self, html_source):
+        self.html_source = html_source
+
+    def execute_script(self, script, *args):
+        return self.html_source
+
+
+def synthetic_bubble(exchange, index):
+    titles = [
+        f"Binance Will Delist COIN{index % 2000}, COIN{(index + 7) % 2000} & COIN{(index + 13) % 2000} on 2024-06-01",
+        f"Delisting of COIN{index % 2000}USDT Perpetual Contract",
+        f"KuCoin Will Delist the COIN{index % 2000} (COIN{index % 2000}) Token",
+        f"Gate.io will delist COIN{index % 2000}3L and COIN{index % 2000}3S",
+        f"Notice on new listing of COIN{index % 2000} https://example.com/listing/{index}",
+        "Daily report: markets are up, more details in the app",
+    ]
+    text = titles[index % len(titles)]
+    return (f'<div class="tgme_widget_message_wrap js-widget_message_wrap">'
+            f'<div class="tgme_widget_message text_not_supported_wrap js-widget_message" '
+            f'data-post="{exchange}_channel/{index}">'
+            f'<div class="tgme_widget_message_text js-message_text" dir="auto">{text}<br/>'
+            f'<a href="https://t.me/{exchange}_channel">{exchange}</a></div>'
+            f'<div class="tgme_widget_message_footer"><span class="tgme_widget_message_meta">'
+            f'<a class="tgme_widget_message_date" href="https://t.me/{exchange}_channel/{index}">'
+            f'<time datetime="2024-01-01T00:00:00+00:00" class="time">00:00</time></a></span></div></div></div>')
+
+
+def build_pages(exchange, size):
+    # size message bubbles on pages of 20 (newest page first), saved bubbles get renumbered and redated
+    saved_bubbles = load_bubbles(exchange)
+    start_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    bubbles = []
+    for index in range(1, size + 1):
+        if saved_bubbles:
+            bubble = saved_bubbles[index % len(saved_bubbles)]
+            bubble = re.sub(r'data-post="([^"/]*)/\d+"', rf'data-post="\1/{index}"', bubble)
+        else:
+            bubble = synthetic_bubble(exchange, index)
+        msg_date = (start_date + timedelta(minutes=index)).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        bubbles.append(re.sub(r'datetime="[^"]*"', f'datetime="{msg_date}"', bubble, count=1))
+
+    pages = []
+    for end in range(len(bubbles), 0, -MESSAGES_PER_PAGE):
+        page_bubbles = bubbles[max(0, end - MESSAGES_PER_PAGE):end]
+        pages.append("<html><body><section class=\"tgme_channel_history\">" + "".join(page_bubbles) +
+                     "</section></body></html>")
+    return pages, saved_bubbles is not None
+
+
+def load_markets(exchange):
+    markets_file = FIXTURES_DIR / "markets" / f"{exchange}.json"
+    if markets_file.exists():
+        return json.loads(markets_file.read_text()), True
+    # synthetic: 2000 coins against a few quotes plus leveraged tokens, about the size of binance
+    markets = {}
+    for index in range(2000):
+        for base in [f"COIN{index}", f"COIN{index}3L", f"COIN{index}3S", f"COIN{index}UP", f"COIN{index}DOWN"]:
+            for quote in ["USDT", "BTC"] if base == f"COIN{index}" else ["USDT"]:
+                markets[f"{base}/{quote}"] = {"id": f"{base}{quote}", "symbol": f"{base}/{quote}",
+                                              "base": base, "quote": quote}
+    return markets, False
+
+
+def load_news_pages():
+    page_files = sorted((FIXTURES_DIR / "kucoin_announcements").glob("*.html"))
+    if page_files:
+        return [page_file.read_text() for page_file in page_files], True
+    paragraphs = "".join(f"<p>{index}. Coin number {index} (COIN{index})</p>" for index in range(1, 60))
+    page = (f"<html><body><div><div><p>KuCoin will delist the following projects:</p>{paragraphs}"
+            f"<p>Trading will stop at 10:00 (UTC).</p></div></div></body></html>")
+    return [page], False
+
+
+def measure(function, repeat):
+    # best wall time of repeat runs, then one extra run under tracemalloc for the allocations
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def fetch_all(scraper, pages):
+    # same fetching as scrape() does, without the progress bar
+    driver = FixtureFetcher(pages)
+    driver.get(scraper.url)
+    messages, prev_message_count, stop_loop = scraper.read_messages(driver, 0, True)
+    while not stop_loop:
+        for _ in range(scraper.initialScrollUpTimes):
+            if not bot.scroll_up(driver):
+                break
+        messages, prev_message_count, stop_loop = scraper.read_messages(driver, prev_message_count)
+    return messages
+
+
+def run_benchmarks(exchanges, sizes, repeat):
+    results = []
+    fixtures = {}
+    # benchmark -> why it didn't run in this environment
+    skipped = {}
+
+    def add_result(name, size, seconds, peak):
+        results.append({
+            "name": name,
+            "size": size,
+            "seconds": round(seconds, 6),
+            "per_item_us": round(seconds / size * 1e6, 3),
+            "items_per_sec": round(size / seconds, 1) if seconds > 0 else None,
+            "peak_alloc_kib": round(peak / 1024, 1),
+        })
+        logging.info(f"{name} [{size}]: {round(seconds, 4)}s, peak {round(peak / 1024, 1)} KiB")
+
+    for exchange in exchanges:
+        scraper_class = bot.SCRAPERS[exchange]
+        markets, fixtures[f"markets/{exchange}"] = load_markets(exchange)
+
+        seconds, peak = measure(lambda: bot.SymbolIndex(markets, scraper_class.coin_prefixes,
+                                                        scraper_class.coin_suffixes), repeat)
+        add_result(f"{exchange}.SymbolIndex", len(markets), seconds, peak)
+
+        for size in sizes:
+            pages, fixtures[f"telegram/{exchange}"] = build_pages(exchange, size)
+            scraper = scraper_class()
+            scraper.pairs = markets
+            scraper.initialScrollUpTimes = 200
+            # the index is built once per markets refresh in production, it's measured on its own above
+            scraper.get_symbol_index()
+
+            seconds, peak = measure(lambda: fetch_all(scraper, pages), repeat)
+            add_result(f"{exchange}.read_messages", size, seconds, peak)
+
+            messages = fetch_all(scraper, pages)
+            seconds, peak = measure(lambda: [scraper.prepare_message_dict(message) for message in messages],
+                                    repeat)
+            add_result(f"{exchange}.prepare_message_dict", size, seconds, peak)
+
+            message_dicts = [scraper.prepare_message_dict(message) for message in messages]
+            # classification only, kucoin's news pages are measured on their own below
+            scraper.read_message_of_news = lambda urls: ""
+
+            def read_all():
+                for message_dict in message_dicts:
+                    message_dict['blacklisted_pairs'] = []
+                    scraper.read_message(message_dict)
+            seconds, peak = measure(read_all, repeat)
+            add_result(f"{exchange}.read_message", size, seconds, peak)
+
+            seconds, peak = measure(lambda: [scraper.get_blacklisted_coins(message_dict['message'])
+                                             for message_dict in message_dicts], repeat)
+            add_result(f"{exchange}.get_blacklisted_coins", size, seconds, peak)
+
+    news_pages, fixtures["kucoin_announcements"] = load_news_pages()
+    seconds, peak = measure(lambda: [bot.KucoinScraper.extract_news_coins(page) for page in news_pages], repeat)
+    add_result("kucoin.extract_news_coins", len(news_pages), seconds, peak)
+
+    skip_reason = run_strategy_benchmarks(sizes, repeat, add_result)
+    if skip_reason is not None:
+        skipped["delist_shorter_strategy.populate_indicators"] = skip_reason
+    return results, fixtures, skipped
+
+
+# a backtest resolves every pair once, so every repetition starts without the per pair cache
+def populate_uncached(strategy, candles, metadata):
+    strategy.feed.pair_dates.clear()
+    return strategy.populate_indicators(candles, metadata)
+
+
+# returns why the strategy couldn't be benchmarked, None if it was
+def run_strategy_benchmarks(sizes, repeat, add_result):
+    try:
+        import pandas
+    except ImportError:
+        logging.warning("pandas is not installed, skipping delist_shorter_strategy")
+        return "pandas is not installed"
+
+    # 30 days of 1m candles for one pair, the strategy reads its processed.json relative to the working directory
+    candles = pandas.DataFrame({
+        "date": pandas.date_range("2024-01-01", periods=30 * 24 * 60, freq="1min", tz="UTC"),
+        "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0,
+    })
+    strategy_path = Path(__file__).resolve().parent / "delist_shorter_strategy.py"
+    cwd = os.getcwd()
+    for size in sizes:
+        rng = random.Random(size)
+        events = [{
+            "exchange": "binance",
+            "date": (datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(30 * 24 * 60)))
+            .strftime(bot.StatVars.datetimeFormat),
+            "date_scraped": "2024-01-01T00:00:00+0000",
+            "message": "Binance Will Delist COIN",
+            "linked_urls": [],
+            "blacklisted_pairs": [f"COIN{rng.randrange(2000)}/.*", f"COIN{rng.randrange(2000)}DOWN"],
+        } for _ in range(size)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            strategies_dir = Path(tmp_dir) / "user_data" / "strategies"
+            strategies_dir.mkdir(parents=True)
+            (strategies_dir / "processed.json").write_text(json.dumps(events))
+            os.chdir(tmp_dir)
+            try:
+                spec = importlib.util.spec_from_file_location("delist_shorter_strategy", strategy_path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                strategy = module.delist_shorter_strategy({})
+            except ImportError as ex:
+                logging.warning(f"skipping delist_shorter_strategy: {ex}")
+                return f"not importable: {ex}"
+            finally:
+                os.chdir(cwd)
+            seconds, peak = measure(
+                lambda: populate_uncached(strategy, candles.copy(), {"pair": "COIN7/USDT:USDT"}), repeat)
+            add_result("delist_shorter_strategy.populate_indicators", size, seconds, peak)
+    return None
+
+
+# fixture name -> date of its --record capture
+def load_recorded():
+    manifest_file = FIXTURES_DIR / "recorded.json"
+    return json.loads(manifest_file.read_text()) if manifest_file.exists() else {}
+
+
+def get_fixture_labels(fixtures):
+    recorded = load_recorded()
+    return {name: "recorded" if name in recorded else "handmade" if from_file else "synthetic"
+            for name, from_file in fixtures.items()}
+
+
+def record(exchanges, pages_count):
+    recorded = load_recorded()
+    for exchange in exchanges:
+        scraper = bot.SCRAPERS[exchange]()
+        page_dir = FIXTURES_DIR / "telegram" / exchange
+        page_dir.mkdir(parents=True, exist_ok=True)
+        # pages of an earlier recording (or handmade ones) mustn't mix with this one
+        for page_file in page_dir.glob("*.html"):
+            page_file.unlink()
+        driver = bot.HttpPageFetcher()
+        driver.get(scraper.url)
+        for page_index in range(pages_count):
+            if page_index > 0 and not driver.scroll_up():
+                break
+            (page_dir / f"{page_index:04d}.html").write_text(driver.pop_new_html())
+        logging.info(f"recorded {page_index + 1} pages of {exchange}")
+        recorded[f"telegram/{exchange}"] = datetime.now(timezone.utc).strftime(bot.StatVars.datetimeFormat)
+
+        markets_dir = FIXTURES_DIR / "markets"
+        markets_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = bot.compact_markets(bot.get_exchange_pairs(exchange))
+        (markets_dir / f"{exchange}.json").write_text(json.dumps(snapshot))
+        logging.info(f"recorded {len(snapshot)} markets of {exchange}")
+        recorded[f"markets/{exchange}"] = datetime.now(timezone.utc).strftime(bot.StatVars.datetimeFormat)
+        (FIXTURES_DIR / "recorded.json").write_text(json.dumps(recorded, indent=4, sort_keys=True))
+
+
+def compare(results, meta, baseline_path, threshold):
+    baseline_output = json.loads(Path(baseline_path).read_text())
+    baseline = {(result["name"], result["size"]): result for result in baseline_output["results"]}
+    # timings of other fixtures, or of a different set of benchmarks, don't compare
+    for key in ("fixtures", "skipped"):
+        if baseline_output["meta"].get(key) != meta[key]:
+            print(f"WARNING: the {key} differ from the baseline: {baseline_output['meta'].get(key)} -> {meta[key]}")
+    regressions = 0
+    for result in results:
+        previous = baseline.get((result["name"], result["size"]))
+        if previous is None or not previous["seconds"]:
+            continue
+        ratio = result["seconds"] / previous["seconds"]
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  <-- REGRESSION"
+        print(f"{result['name']:<50} {result['size']:>6} {previous['seconds']:>10.4f}s -> "
+              f"{result['seconds']:>10.4f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    global FIXTURES_DIR
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the delist scraper's parsing and matching")
+    parser.add_argument("--exchanges", nargs="*", default=list(bot.SCRAPERS.keys()))
+    parser.add_argument("--sizes", nargs="*", type=int, default=SIZES, help="messages per channel")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR))
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against the results json of an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slower than baseline * threshold counts as a regression")
+    parser.add_argument("--record", type=int, metavar="PAGES",
+                        help="record this many t.me/s/ pages and the markets of every exchange as fixtures and exit")
+    args = parser.parse_args()
+
+    FIXTURES_DIR = Path(args.fixtures)
+
+    if args.record:
+        record(args.exchanges, args.record)
+        return
+
+    # the scrapers check their stop condition against the store, an empty in-memory one keeps them scrolling
+    bot.StatVars.processed_store = bot.ProcessedStore(":memory:")
+    logging.getLogger().setLevel(logging.WARNING)
+    results, fixtures, skipped = run_benchmarks(args.exchanges, args.sizes, args.repeat)
+
+    output = {
+        "meta": {
+            "date": datetime.now(timezone.utc).strftime(bot.StatVars.datetimeFormat),
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "html_parser": bot.StatVars.html_parser,
+            "fixtures": get_fixture_labels(fixtures),
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, indent=4))
+    else:
+        print(json.dumps(output, indent=4))
+
+    if args.compare and compare(results, output["meta"], args.compare, args.threshold) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,166 @@
+import argparse
 import concurrent.futures
+import cProfile
 import gc
+import gzip
+import hashlib
+import hmac
 import logging
+import logging.handlers
 
 import os
+import random
+import pstats
 import re
+import signal
+import socket
+import sqlite3
 import sys
+import threading
 import time
+import tracemalloc
+import zlib
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
 from pathlib import Path
-import fnmatch
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from tqdm import tqdm
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import rapidjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import ccxt
 import freqtrade_client
 
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service as FirefoxService
+# lxml is a lot faster, html.parser is the fallback if it isn't installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# selenium is only needed for fetch_mode = 'browser' and the kucoin announcement pages, the telegram channels are
+# fetched via http
+try:
+    from selenium import webdriver
+    from selenium.webdriver.firefox.service import Service as FirefoxService
+except ImportError:
+    webdriver = None
 
 
 class StatVars:
     # Please don't set it to 0 !
     scrollUpSleepTime = 0.5
+    # scrolls per persisted batch in --backfill mode, every scroll loads about 20 messages
+    backfill_batch_scrolls = 10
+    # after a restart only scroll as far back as the newest post in the store instead of initialScrollUpTimes
+    warm_start = True
+    # telegram loads about this many messages per scroll, used to size the warm start scroll window
+    messages_per_scroll = 20
 
     path_processed_file = 'processed.json'
     path_bots_file = 'bot-groups.json'
     CONFIG_PARSE_MODE = rapidjson.PM_COMMENTS | rapidjson.PM_TRAILING_COMMAS
 
-    has_been_processed = []
-    unique_identifiers = []
+    # all scraped messages live in a sqlite store, processed.json is only imported once and exported on demand
+    path_processed_db = 'processed.sqlite'
+    processed_store = None
+    # exchange -> newest post id on the channel page of the last successful scrape
+    seen_post_ids = {}
+    # re-export processed.json (for delist_shorter_strategy) every time news got saved
+    export_processed_on_save = False
+
+    # announcement pages linked from messages (kucoin "certain projects"), see PageCache
+    path_page_cache = 'page_cache.sqlite'
+    page_cache = None
+    page_cache_ttl_secs = 30 * 24 * 60 * 60  # None: never expire
+    page_cache_max_bytes = 50 * 1024 * 1024
+    # never fetch pages, only use the cache (offline tests and replays)
+    page_cache_only = False
 
     to_be_processed = []
 
     bot_groups = []
+    # timeout per call to a bot, the bots are called in parallel
+    bot_timeout = 10
+    bot_clients = {}
+    notify_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="notify")
     datetimeFormat = '%Y-%m-%dT%H:%M:%S%z'
 
+    # seconds between two scrapes of an exchange, exchange_loop_secs overrides it per exchange
     loop_secs = 10
+    exchange_loop_secs = {'binance': 5}
+    # channels that posted less than quiet_posts_per_day (last 7 days) are polled up to quiet_max_factor times
+    # less often, but at least every max_loop_secs. Only once the store reaches back quiet_min_history_secs for the
+    # exchange, a new or emptied store knows nothing about the posting rate yet
+    quiet_min_history_secs = 24 * 3600
+    quiet_posts_per_day = 5
+    quiet_max_factor = 6
+    max_loop_secs = 60
+    # in the hours (UTC) delistings usually get announced the interval is multiplied by hot_window_factor.
+    # exchange -> [(start hour, end hour), ...], exchanges without an entry learn their hot hours from the store:
+    # every hour with at least hot_hour_share of their delisting announcements (once there are 20 of them)
+    hot_windows_utc = {}
+    hot_hour_share = 0.1
+    hot_window_factor = 0.5
+    min_loop_secs = 2
+    # the posting rate and hot hours get recalculated from the store this often
+    activity_refresh_secs = 15 * 60
+    # how many exchanges may be scraped at the same time, every one of them has its own fetch backend
+    # (keep this low with fetch_mode = 'browser', every slot is a firefox instance)
+    max_concurrent_scrapers = 5
+    # a failing exchange is retried after error_sleep_secs, doubled with every further failure up to
+    # error_sleep_max_secs (+-backoff_jitter), the other exchanges continue as usual
+    error_sleep_secs = 30
+    error_sleep_max_secs = 15 * 60
+    backoff_jitter = 0.2
+    process_lock = threading.RLock()
+
+    # Several scraper instances (e.g. on two VPS) coordinate through this sqlite file on shared storage: every
+    # exchange is scraped by the node holding its lease, every (announcement, bot, action) is executed once.
+    # None: this instance does everything on its own
+    coordination_db = None
+    node_id = f"{socket.gethostname()}-{os.getpid()}"
+    # another node takes over an exchange if its lease wasn't renewed for this long (keep it above max_loop_secs)
+    lease_secs = 180
+    ledger_keep_days = 30
+    # a force order per bot and pair is executed once within this window, whichever announcement triggered it: the
+    # telegram channel and the website (or a pushed copy) post the same delisting under different keys
+    force_order_window_secs = 24 * 3600
+    coordinator = None
+
+    # collects the blacklisted pairs per bot config file, written once per scheduler tick (set below the class)
+    blacklist_writer = None
+
+    # shared browsers, see DriverPool (set below the class)
+    driver_pool = None
+    max_drivers = 2
+    driver_recycle_after_pages = 100
+    driver_lease_timeout = 300
+
+    # 'http' fetches the static t.me/s/ pages without a browser, 'browser' uses headless firefox via selenium
+    fetch_mode = 'http'
+    http_timeout = 30
+    http_pool_size = 10
+    http_user_agent = ('Mozilla/5.0 (X11; Linux x86_64; rv:126.0) Gecko/20100101 Firefox/126.0')
+    http_session = None
+    html_parser = HTML_PARSER
+
+    # The announcement lists of the exchange websites (json, see ApiScraper) are polled next to the telegram channels
+    # of these exchanges, whichever source sees an announcement first blacklists its pairs, e.g. ['binance', 'kucoin'].
+    # Off by default: the payloads are only verified against the stubs in tests/
+    web_sources = []
+    # ETag/Last-Modified/body hash of the last handled response per url, an unchanged list costs a 304
+    http_validators = {}
+    # only pushed and web announcements younger than this trigger force orders, older ones (a forwarder replaying
+    # its backlog, the web list after a downtime) just get saved and blacklisted
+    fresh_news_secs = 3600
 
     logging.basicConfig(
         level=logging.INFO,
@@ -48,8 +170,51 @@ class StatVars:
 
     driver = None
 
+    metrics = None  # Metrics(), set below the class
+    # local http server for GET /metrics and POST /ingest, None disables it
+    http_host = '127.0.0.1'
+    http_port = None
+    # POST /ingest needs "Authorization: Bearer <ingest_token>" if set
+    ingest_token = None
+    ingest_max_bytes = 1024 * 1024
+    # rolling metrics file in the prometheus text format, None disables it
+    metrics_file = 'metrics.prom'
+    metrics_file_secs = 60
+    # seconds per stage (page_load, scroll, parse, classify, ...) of every scrape loop, see record_stages:
+    # the last stage_records_size loops in memory (GET /stages) and as json lines in a rotating log
+    stage_records_size = 1000
+    stage_records = None  # deque, see get_stage_records
+    stage_log_file = 'stages.log'  # None: only in memory
+    stage_log_max_bytes = 5 * 1024 * 1024
+    stage_log_backups = 3
+    stage_logger = None
+    # create this file (optionally containing the number of loops) or send SIGUSR1 to profile the next
+    # profile_loops scrape loops with cProfile and tracemalloc, the results land in profile_dir
+    profile_control_file = 'profile.request'
+    profile_loops = 5
+    profile_dir = 'profiles'
+    profiler = None  # LoopProfiler(), set below the class
+    profile_signaled = threading.Event()  # set by the SIGUSR1 handler, acted on by check_profile_request
+
+    # ccxt markets are persisted per exchange, so a restart doesn't have to wait for load_markets()
+    markets_snapshot_dir = 'markets'
+    markets_snapshot_version = 1
+    markets_refresh_secs = 24 * 60 * 60
+
+    # exchange -> markets of the running bot, kept up to date by the markets refresher
+    exchanges_pairs = {}
+    # exchange -> SymbolIndex of its current markets
+    symbol_indexes = {}
+
+    # overrides CLASSIFICATION_RULES per exchange if the file exists, see README
+    path_classification_file = 'classification.json'
+    # exchange -> compiled Classifier
+    classifiers = {}
+
 
 def set_driver():
+    if webdriver is None:
+        raise RuntimeError("selenium is not installed, it is needed for fetch_mode = 'browser'")
     logging.info("starting driver for browser")
     # Set up Firefox options
     options = webdriver.FirefoxOptions()
@@ -78,6 +243,662 @@ def set_driver():
     return driver
 
 
+def get_http_session():
+    # one pooled session for all http fetches, keeps the connections to t.me alive between loops
+    if StatVars.http_session is None:
+        session = requests.Session()
+        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=StatVars.http_pool_size, pool_maxsize=StatVars.http_pool_size,
+                              max_retries=retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "User-Agent": StatVars.http_user_agent,
+            "Accept-Language": "en",
+        })
+        StatVars.http_session = session
+    return StatVars.http_session
+
+
+class HttpPageFetcher:
+    # Browserless stand-in for the selenium driver on the static t.me/s/<channel> pages.
+    # get() loads the newest page, scroll_up() loads the page before the oldest loaded post via ?before=<post id>.
+    # Loaded pages are only kept until pop_new_html() hands them out, page_source is the page of the last get()
+    post_id_pattern = re.compile(r'data-post="[^"]*/(\d+)"')
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else get_http_session()
+        self.url = None
+        self.page_source = ""
+        self.new_pages = []
+        self.oldest_post_id = None
+
+    def get(self, url):
+        self.url = url
+        self.page_source = self.fetch(url)
+        self.new_pages = [self.page_source]
+        self.oldest_post_id = self.get_oldest_post_id(self.page_source)
+
+    # returns False if there is nothing older left to load
+    def scroll_up(self):
+        if self.oldest_post_id is None:
+            return False
+        # get() may have been called with ?before= already (backfill), the new one replaces it
+        html_source = self.fetch(self.url.split('?')[0], params={"before": self.oldest_post_id})
+        oldest_post_id = self.get_oldest_post_id(html_source)
+        if oldest_post_id is None or oldest_post_id >= self.oldest_post_id:
+            return False
+        self.new_pages.append(html_source)
+        self.oldest_post_id = oldest_post_id
+        return True
+
+    # html of all pages that were loaded since the last call, oldest message first (like in the browser)
+    def pop_new_html(self):
+        html_source = "".join(reversed(self.new_pages))
+        self.new_pages = []
+        return html_source
+
+    def fetch(self, url, params=None):
+        response = self.session.get(url, params=params, timeout=StatVars.http_timeout)
+        response.raise_for_status()
+        return response.text
+
+    def get_oldest_post_id(self, html_source):
+        post_ids = [int(post_id) for post_id in self.post_id_pattern.findall(html_source)]
+        return min(post_ids) if post_ids else None
+
+    def quit(self):
+        # the session is shared, only drop what we loaded
+        self.page_source = ""
+        self.new_pages = []
+        self.oldest_post_id = None
+
+
+# GET with the validators of the last handled response of that url, returns (None, None) if the content didn't change
+# (a 304, or the same body from a server that ignores them). Otherwise (json, validators), hand the validators to
+# remember_http_validators once the content got handled, so a failed run fetches it again.
+def fetch_json_if_changed(url, params=None):
+    validators = StatVars.http_validators.get(url, {})
+    headers = {"Accept": "application/json"}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = get_http_session().get(url, params=params, headers=headers, timeout=StatVars.http_timeout)
+    if response.status_code == 304:
+        return None, None
+    response.raise_for_status()
+    digest = hashlib.sha1(response.content).hexdigest()
+    if digest == validators.get("digest"):
+        return None, None
+    return response.json(), {"etag": response.headers.get("ETag"),
+                             "last_modified": response.headers.get("Last-Modified"),
+                             "digest": digest}
+
+
+def remember_http_validators(url, validators):
+    if validators is not None:
+        StatVars.http_validators[url] = validators
+
+
+class DriverPool:
+    # Browsers shared by the scrape jobs (fetch_mode = 'browser') and the announcement sub-pages.
+    # At most max_size drivers exist at once, every lease gets a healthy one and a driver is recycled
+    # after recycle_after_pages pages, so neither processes nor firefox memory can pile up.
+    def __init__(self, factory, max_size, recycle_after_pages):
+        self.factory = factory
+        self.max_size = max_size
+        self.recycle_after_pages = recycle_after_pages
+        self.idle = []
+        self.pages_served = {}
+        self.size = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        driver = self.acquire(timeout if timeout is not None else StatVars.driver_lease_timeout)
+        try:
+            yield driver
+        except BaseException:
+            # whatever state it is in, don't hand it out again
+            self.release(driver, broken=True)
+            raise
+        self.release(driver)
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                while self.idle:
+                    driver = self.idle.pop()
+                    if self.is_healthy(driver):
+                        return driver
+                    logging.warning("discarding a driver that didn't respond anymore")
+                    self.discard(driver)
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                if not self.condition.wait(max(deadline - time.monotonic(), 0)) and time.monotonic() >= deadline:
+                    raise TimeoutError(f"no driver got free within {timeout}s (max_drivers = {self.max_size})")
+        try:
+            driver = self.factory()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        self.pages_served[driver] = 0
+        return driver
+
+    def release(self, driver, broken=False):
+        with self.condition:
+            self.pages_served[driver] = self.pages_served.get(driver, 0) + 1
+            if broken or self.pages_served[driver] >= self.recycle_after_pages:
+                self.discard(driver)
+            else:
+                self.idle.append(driver)
+            self.condition.notify()
+
+    # call with the condition held
+    def discard(self, driver):
+        self.pages_served.pop(driver, None)
+        self.size -= 1
+        try:
+            driver.quit()
+        except Exception as ex:
+            logging.error(f"an error occurred while quitting a driver: {ex}")
+
+    @staticmethod
+    def is_healthy(driver):
+        if isinstance(driver, HttpPageFetcher):
+            return True
+        try:
+            driver.current_url  # noqa: B018, a round trip to geckodriver
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        with self.condition:
+            while self.idle:
+                self.discard(self.idle.pop())
+
+
+def get_page_fetcher(fetch_mode=None):
+    fetch_mode = fetch_mode or StatVars.fetch_mode
+    if fetch_mode == 'browser':
+        if webdriver is not None:
+            return set_driver()
+        logging.warning("selenium is not installed, falling back to fetching pages via http")
+    return HttpPageFetcher()
+
+
+# Marks every message bubble it returns, so each bubble leaves the browser exactly once
+NEW_BUBBLES_SCRIPT = """
+var bubbles = document.getElementsByClassName(arguments[0]);
+var html = [];
+for (var i = 0; i < bubbles.length; i++) {
+    if (!bubbles[i].hasAttribute('data-scraped')) {
+        bubbles[i].setAttribute('data-scraped', '1');
+        html.push(bubbles[i].outerHTML);
+    }
+}
+return html.join('');
+"""
+
+
+# html of the message bubbles that were loaded since the last call, oldest message first
+def get_new_bubbles_html(driver, message_bubble):
+    if isinstance(driver, HttpPageFetcher):
+        return driver.pop_new_html()
+    return driver.execute_script(NEW_BUBBLES_SCRIPT, message_bubble)
+
+
+StatVars.driver_pool = DriverPool(lambda: get_page_fetcher('browser'), StatVars.max_drivers,
+                                  StatVars.driver_recycle_after_pages)
+
+
+# highest telegram post id on a page, None for pages without posts (or other sources)
+def get_newest_page_post_id(html_source):
+    post_ids = [int(post_id) for post_id in HttpPageFetcher.post_id_pattern.findall(html_source or "")]
+    return max(post_ids) if post_ids else None
+
+
+def scroll_up(driver):
+    # returns False if the fetch backend knows that there are no older messages left
+    if isinstance(driver, HttpPageFetcher):
+        return driver.scroll_up()
+    driver.execute_script("window.scrollTo(0, 0);")
+    with timed_stage("scroll_sleep"):
+        time.sleep(StatVars.scrollUpSleepTime)
+    return True
+
+
+class Histogram:
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.bucket_counts[index] += 1
+
+
+class Metrics:
+    # Histograms and counters in the prometheus text format, served on http_port (GET /metrics)
+    # and/or written to metrics_file every metrics_file_secs
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    @staticmethod
+    def get_key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.histograms.setdefault(self.get_key(name, labels), Histogram()).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            key = self.get_key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        labels = list(labels) + list(extra)
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{self.format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bucket, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f"{name}_bucket{self.format_labels(labels, [('le', bucket)])} {bucket_count}")
+                lines.append(f"{name}_bucket{self.format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {round(histogram.sum, 6)}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            outfile.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class LocalHTTPHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == "/metrics":
+            body = StatVars.metrics.render().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif path == "/stages":
+            body = rapidjson.dumps(list(get_stage_records())).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # announcements pushed by a forwarder, see ingest_announcements
+    def do_POST(self):
+        if self.path.split('?')[0] != "/ingest":
+            self.send_error(404)
+            return
+        if StatVars.ingest_token is not None and not hmac.compare_digest(
+                self.headers.get("Authorization", ""), f"Bearer {StatVars.ingest_token}"):
+            self.send_error(401)
+            return
+        content_length = self.headers.get("Content-Length") or "0"
+        if not content_length.isdigit():
+            # a negative length would make the read block until the client closes the connection
+            self.send_error(400, "invalid Content-Length")
+            return
+        content_length = int(content_length)
+        if content_length > StatVars.ingest_max_bytes:
+            self.send_error(413)
+            return
+        try:
+            payload = rapidjson.loads(self.rfile.read(content_length))
+            result = ingest_announcements(payload if isinstance(payload, list) else [payload])
+        except (ValueError, TypeError, KeyError) as ex:
+            self.send_error(400, str(ex))
+            return
+        except RuntimeError as ex:
+            self.send_error(503, str(ex))
+            return
+        body = rapidjson.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def start_http_server():
+    server = ThreadingHTTPServer((StatVars.http_host, StatVars.http_port), LocalHTTPHandler)
+    threading.Thread(target=server.serve_forever, name="http-server", daemon=True).start()
+    logging.info(f"serving GET /metrics and POST /ingest on http://{StatVars.http_host}:{server.server_port}")
+    return server
+
+
+def parse_date(date_string):
+    return datetime.strptime(date_string, StatVars.datetimeFormat)
+
+
+# announcement -> scrape -> persist, per fresh message. Persisted means in the store and its pairs written to the
+# bot config files
+def observe_timeline(exchange, message_dicts, persisted_at):
+    for message_dict in message_dicts:
+        announced_at = parse_date(message_dict['date'])
+        scraped_at = parse_date(message_dict['date_scraped'])
+        StatVars.metrics.observe("delist_announcement_to_scrape_seconds",
+                                 (scraped_at - announced_at).total_seconds(), exchange=exchange)
+        StatVars.metrics.observe("delist_scrape_to_persist_seconds",
+                                 (persisted_at - scraped_at).total_seconds(), exchange=exchange)
+
+
+def record_bot_ack(timeline, ip, action):
+    if timeline is None:
+        return
+    acknowledged_at = datetime.now(timezone.utc)
+    StatVars.metrics.observe("delist_scrape_to_bot_ack_seconds",
+                             (acknowledged_at - timeline['scraped_at']).total_seconds(),
+                             exchange=timeline['exchange'], action=action, bot=ip)
+    StatVars.metrics.observe("delist_announcement_to_bot_ack_seconds",
+                             (acknowledged_at - timeline['announced_at']).total_seconds(),
+                             exchange=timeline['exchange'], action=action, bot=ip)
+
+
+StatVars.metrics = Metrics()
+
+
+# the stages of the scrape loop that runs in this thread, see record_stages
+stage_context = threading.local()
+
+
+# Collects the seconds per stage of one scrape loop. Stages may be nested (match runs inside classify),
+# so they don't add up to the total.
+@contextmanager
+def record_stages(exchange):
+    stages = {}
+    stage_context.stages = stages
+    start_time = time.perf_counter()
+    try:
+        yield stages
+    finally:
+        stage_context.stages = None
+        write_stage_record(exchange, stages, time.perf_counter() - start_time)
+
+
+@contextmanager
+def timed_stage(stage):
+    stages = getattr(stage_context, "stages", None)
+    if stages is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds, count = stages.get(stage, (0.0, 0))
+        stages[stage] = (seconds + time.perf_counter() - start_time, count + 1)
+
+
+def get_stage_logger():
+    if StatVars.stage_logger is None:
+        stage_logger = logging.getLogger(f"{__name__}.stages")
+        stage_logger.propagate = False
+        stage_logger.setLevel(logging.INFO)
+        stage_logger.addHandler(logging.handlers.RotatingFileHandler(
+            StatVars.stage_log_file, maxBytes=StatVars.stage_log_max_bytes, backupCount=StatVars.stage_log_backups))
+        StatVars.stage_logger = stage_logger
+    return StatVars.stage_logger
+
+
+# rebuilt (keeping the newest records) whenever stage_records_size changed
+def get_stage_records():
+    stage_records = StatVars.stage_records
+    if stage_records is None or stage_records.maxlen != StatVars.stage_records_size:
+        stage_records = deque(stage_records or (), maxlen=StatVars.stage_records_size)
+        StatVars.stage_records = stage_records
+    return stage_records
+
+
+def write_stage_record(exchange, stages, total_seconds):
+    record = {
+        "time": datetime.now(timezone.utc).strftime(StatVars.datetimeFormat),
+        "exchange": exchange,
+        "seconds": round(total_seconds, 4),
+        "stages": {stage: {"seconds": round(seconds, 4), "count": count} for stage, (seconds, count) in stages.items()},
+    }
+    get_stage_records().append(record)
+    for stage, (seconds, _) in stages.items():
+        StatVars.metrics.observe("delist_stage_seconds", seconds, exchange=exchange, stage=stage)
+    if StatVars.stage_log_file:
+        get_stage_logger().info(rapidjson.dumps(record))
+
+
+class LoopProfiler:
+    # Profiles the next scrape loops on request, without a restart: cProfile of every profiled loop (one at a time,
+    # the others keep running unprofiled) and what tracemalloc saw allocated meanwhile.
+    # Writes <profile_dir>/<time>.pstats (open it with python -m pstats) and <time>-memory.txt
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loops_left = 0
+        self.profiling = False
+        self.profile_stats = None
+        self.memory_snapshot = None
+
+    def request(self, loops):
+        with self.lock:
+            if self.loops_left > 0 or self.profiling:
+                logging.info("profiling is running already")
+                return
+            self.loops_left = loops
+            self.profile_stats = None
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+            self.memory_snapshot = tracemalloc.take_snapshot()
+        logging.info(f"profiling the next {loops} scrape loops")
+
+    @contextmanager
+    def profile_loop(self):
+        with self.lock:
+            profiled = self.loops_left > 0 and not self.profiling
+            if profiled:
+                self.loops_left -= 1
+                self.profiling = True
+        if not profiled:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.profiling = False
+                if self.profile_stats is None:
+                    self.profile_stats = pstats.Stats(profile)
+                else:
+                    self.profile_stats.add(profile)
+                if self.loops_left == 0:
+                    self.write_results()
+
+    def write_results(self):
+        profile_dir = Path(StatVars.profile_dir)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.profile_stats.dump_stats(str(profile_dir / f"{name}.pstats"))
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with open(profile_dir / f"{name}-memory.txt", "w") as outfile:
+            outfile.write("allocated while profiling:\n")
+            for stat in snapshot.compare_to(self.memory_snapshot, "lineno")[:30]:
+                outfile.write(f"{stat}\n")
+            outfile.write("\nlargest allocations:\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                outfile.write(f"{stat}\n")
+        self.memory_snapshot = None
+        logging.info(f"wrote the profile to {profile_dir / name}.pstats and {profile_dir / name}-memory.txt")
+
+
+StatVars.profiler = LoopProfiler()
+
+
+# the control file asks for a profile of the next n loops (its content, profile_loops if empty), SIGUSR1 for
+# profile_loops
+def check_profile_request():
+    if StatVars.profile_signaled.is_set():
+        StatVars.profile_signaled.clear()
+        StatVars.profiler.request(StatVars.profile_loops)
+    control_file = Path(StatVars.profile_control_file)
+    if not control_file.exists():
+        return
+    content = control_file.read_text().strip()
+    control_file.unlink()
+    StatVars.profiler.request(int(content) if content.isdigit() else StatVars.profile_loops)
+
+
+# the handler runs on the main thread between any two bytecodes, possibly while it holds the profiler's lock,
+# so it only sets the event
+def install_profile_signal():
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: StatVars.profile_signaled.set())
+
+
+# Persists freshly scraped messages, saves their pairs to the blacklists and notifies the bots.
+# The scrape jobs run concurrently, so everything touching the shared state is serialized here.
+def process_new_messages(exchange, to_be_processed, fresh):
+    if len(to_be_processed) == 0:
+        return
+    with StatVars.process_lock:
+        StatVars.to_be_processed = to_be_processed
+        report_to_be_processed()
+        with timed_stage("persist"):
+            save_processed(StatVars.to_be_processed)
+        StatVars.metrics.inc("delist_messages_total", len(to_be_processed), exchange=exchange)
+
+        # make one big list of newly delisted pairs, and remember which announcement delisted which pair
+        new_blacklist = []
+        announcements = {}
+        for message_dict in StatVars.to_be_processed:
+            if message_dict is None:
+                continue
+            new_blacklist.extend(message_dict["blacklisted_pairs"])
+            for pair in message_dict["blacklisted_pairs"]:
+                announcements.setdefault(pair, get_announcement_key(message_dict))
+
+        if len(new_blacklist) > 0:
+            save_blacklist(get_markets_exchange(exchange), new_blacklist)
+            # the messages are persisted as processed already, their pairs must not wait for the next tick
+            with timed_stage("persist"):
+                StatVars.blacklist_writer.flush()
+
+        timeline = None
+        if fresh:
+            # the initial gathering and backfills would only skew the latencies
+            observe_timeline(exchange, StatVars.to_be_processed, datetime.now(timezone.utc))
+            newest_message = StatVars.to_be_processed[0]
+            timeline = {"exchange": exchange,
+                        "announced_at": parse_date(newest_message['date']),
+                        "scraped_at": parse_date(newest_message['date_scraped'])}
+
+        if len(new_blacklist) > 0:
+            with timed_stage("notify"):
+                notify_bots(force_orders=fresh, timeline=timeline, announcements=announcements)
+
+        reset_static_variables()
+
+
+# Announcements pushed by a forwarder (POST /ingest) go the same way as scraped ones and count as fresh news,
+# unless they are older than fresh_news_secs.
+# Polling stays as the backstop, it skips them as already processed (by post id, else by date) and they don't move
+# its warm start mark, so the posts before them still get scraped.
+# Returns what was accepted, raises ValueError for bad payloads and RuntimeError if the markets aren't loaded yet.
+def ingest_announcements(payloads):
+    scrapers = {}
+    pushed_messages = []
+    for payload in payloads:
+        exchange = str(payload.get('exchange', '')).lower() if isinstance(payload, dict) else ''
+        if exchange not in SCRAPERS:
+            raise ValueError(f"unknown exchange '{exchange}', use one of {', '.join(SCRAPERS)}")
+        if exchange not in scrapers:
+            if not StatVars.exchanges_pairs.get(exchange):
+                raise RuntimeError(f"{exchange}: the markets are not loaded yet, try again later")
+            scrapers[exchange] = SCRAPERS[exchange]()
+            scrapers[exchange].pairs = StatVars.exchanges_pairs[exchange]
+        pushed_messages.append((exchange, scrapers[exchange].prepare_pushed_message_dict(payload)))
+
+    result = {"accepted": 0, "duplicates": 0, "blacklisted_pairs": []}
+    for exchange, scraper in scrapers.items():
+        # classified without the lock, a kucoin announcement page can take minutes and the scrapers must not wait
+        classified = []
+        identifiers = set()
+        for message_exchange, message_dict in pushed_messages:
+            identifier = get_unique_identifier(message_dict)
+            if message_exchange != exchange or message_dict['message'] == "":
+                continue
+            if identifier in identifiers or is_processed(message_dict):
+                result["duplicates"] += 1
+                continue
+            identifiers.add(identifier)
+            classified.append(scraper.read_message(message_dict))
+
+        with StatVars.process_lock:
+            # a scraper may have processed some of them meanwhile
+            to_be_processed = []
+            for message_dict in classified:
+                if is_processed(message_dict):
+                    result["duplicates"] += 1
+                else:
+                    to_be_processed.append(message_dict)
+            # newest first, like the scrapers hand them over
+            to_be_processed.sort(key=lambda message_dict: parse_date(message_dict['date']), reverse=True)
+            StatVars.metrics.inc("delist_ingested_total", len(to_be_processed), exchange=exchange)
+            result["accepted"] += len(to_be_processed)
+            for message_dict in to_be_processed:
+                result["blacklisted_pairs"].extend(sorted(message_dict['blacklisted_pairs']))
+            old_messages, fresh_messages = split_fresh_news(to_be_processed)
+            process_new_messages(exchange, old_messages, fresh=False)
+            process_new_messages(exchange, fresh_messages, fresh=True)
+    return result
+
+
+# (old, fresh) messages, only the ones younger than fresh_news_secs may trigger force orders
+def split_fresh_news(message_dicts):
+    fresh_since = datetime.now(timezone.utc) - timedelta(seconds=StatVars.fresh_news_secs)
+    old_messages = []
+    fresh_messages = []
+    for message_dict in message_dicts:
+        if parse_date(message_dict['date']) >= fresh_since:
+            fresh_messages.append(message_dict)
+        else:
+            old_messages.append(message_dict)
+    return old_messages, fresh_messages
+
+
 def report_to_be_processed():
     for message_dict in StatVars.to_be_processed:
         logging.info(f"caught fresh news for {message_dict['exchange']}: {message_dict['message']}")
@@ -104,18 +925,496 @@ def get_exchange_pairs(exchange_name):
                 time.sleep(sleep_timer_on_error)
         except Exception as e:
             logging.info(f"Error fetching markets for {exchange_name}: {e}. Retrying after {sleep_timer_on_error}s ...")
+            time.sleep(sleep_timer_on_error)
+
+
+# only what the scrapers use from ccxt's markets, keeps the snapshots and the memory small
+def compact_markets(markets):
+    return {symbol: {key: market.get(key) for key in ("id", "symbol", "base", "quote", "type", "active")}
+            for symbol, market in markets.items()}
+
+
+def get_markets_snapshot_path(exchange_name):
+    return Path(StatVars.markets_snapshot_dir) / f"{exchange_name}.json.gz"
+
+
+def save_markets_snapshot(exchange_name, markets):
+    path = get_markets_snapshot_path(exchange_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot = {
+        "version": StatVars.markets_snapshot_version,
+        "exchange": exchange_name,
+        "timestamp": time.time(),
+        "markets": markets,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt") as snapshot_file:
+        snapshot_file.write(rapidjson.dumps(snapshot))
+    os.replace(tmp_path, path)
+
+
+# returns the markets of the last snapshot, None if there is none (or an outdated format)
+def load_markets_snapshot(exchange_name):
+    path = get_markets_snapshot_path(exchange_name)
+    try:
+        with gzip.open(path, "rt") as snapshot_file:
+            snapshot = rapidjson.loads(snapshot_file.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        logging.warning(f"could not read the markets snapshot {path}: {ex}")
+        return None
+    if snapshot.get("version") != StatVars.markets_snapshot_version:
+        return None
+    age_hours = round((time.time() - snapshot["timestamp"]) / 3600, 1)
+    logging.info(f"Loaded {len(snapshot['markets'])} pairs of {exchange_name} from a snapshot of {age_hours}h ago")
+    return snapshot["markets"]
+
+
+class SymbolIndex:
+    # Lookup tables for get_blacklisted_coins, built once whenever the markets are refreshed.
+    # coins: every market id (without "-") and base
+    # derivatives: coin -> bases that are the coin with a prefix and/or suffix, e.g. BTC -> {"BTCDOWN", "000BTCUP"}
+    def __init__(self, markets, coin_prefixes, coin_suffixes):
+        self.markets = markets
+        self.coins = set()
+        self.derivatives = {}
+
+        bases = set()
+        for pair in markets.values():
+            self.coins.add(pair['id'].upper().replace("-", ""))
+            if 'base' in pair:
+                bases.add(pair['base'].upper())
+        self.coins.update(bases)
+
+        # same combinations as prefix + coin + suffix, prefix + coin and coin + suffix,
+        # only if the exchange has prefixes and suffixes
+        for prefix in coin_prefixes:
+            prefix = prefix.upper()
+            for suffix in coin_suffixes:
+                suffix = suffix.upper()
+                for base in bases:
+                    has_prefix = base.startswith(prefix)
+                    has_suffix = base.endswith(suffix)
+                    if has_prefix and has_suffix:
+                        self.add_derivative(base[len(prefix):len(base) - len(suffix)], base)
+                    if has_prefix:
+                        self.add_derivative(base[len(prefix):], base)
+                    if has_suffix:
+                        self.add_derivative(base[:len(base) - len(suffix)], base)
+
+    def add_derivative(self, coin, base):
+        if coin:
+            self.derivatives.setdefault(coin, set()).add(base)
+
+
+def get_symbol_index(exchange, markets, coin_prefixes, coin_suffixes):
+    symbol_index = StatVars.symbol_indexes.get(exchange)
+    # markets get replaced as a whole on refresh, so the identity tells us whether the index is outdated
+    if symbol_index is None or symbol_index.markets is not markets:
+        symbol_index = SymbolIndex(markets, coin_prefixes, coin_suffixes)
+        StatVars.symbol_indexes[exchange] = symbol_index
+    return symbol_index
+
+
+# Which announcements blacklist coins. Every exchange has a list of rules, the rule with the highest priority
+# that has one of its phrases in the message decides (ties: first in the list). "exclude" rules drop the
+# message, "include" rules run their extractor: "message" takes the coins from the message itself,
+# "news_page" from the announcement pages linked in it. Phrases are case-insensitive.
+# A string instead of a list reuses the rules of that exchange.
+CLASSIFICATION_RULES = {
+    'binance': [
+        {"priority": 1, "exclude": ["Binance Will Delist StableUSD", "Binance Will Delist All FTX Leveraged Tokens",
+                                    "Binance Will Delist FTT Margin Pairs", "DERIVATIVE"]},
+        {"priority": 0, "include": ["Binance Will Delist "], "extractor": "message"},
+    ],
+    'kucoin': [
+        {"priority": 2, "exclude": ["DAILY REPORT", "KuCoin Will Delist the Sandbox Mode", "DERIVATIVE"]},
+        {"priority": 1, "include": ["KuCoin Will Delist Certain Projects"], "extractor": "news_page"},
+        {"priority": 0, "include": ["KUCOIN WILL DELIST THE", "WILL BE REMOVED FROM THE EXCHANGE",
+                                    "RISK ANNOUNCEMENT", "WILL BE DELISTED FROM KUCOIN"], "extractor": "message"},
+    ],
+    'bybit': [
+        {"priority": 1, "exclude": ["CONTRACT"]},
+        {"priority": 0, "include": ["Delisting of"], "extractor": "message"},
+    ],
+    'okx': [
+        {"priority": 1, "exclude": ["Contact", "DERIVATIVE"]},
+        {"priority": 0, "include": ["Delisting of"], "extractor": "message"},
+    ],
+    'gateio': [
+        {"priority": 1, "exclude": ["DERIVATIVE"]},
+        {"priority": 0, "include": ["Delist"], "extractor": "message"},
+    ],
+    'htx': 'gateio',
+    'kucoin_web': 'kucoin',
+    'binance_web': 'binance',
+}
+EXTRACTORS = ("message", "news_page")
+
+
+class Classifier:
+    # All phrases of an exchange compiled into one regex, so a message is scanned once no matter how many rules
+    # there are. The lookahead finds the longest phrase at every position, the phrases contained in it
+    # (e.g. "BINANCE WILL DELIST " in "BINANCE WILL DELIST STABLEUSD") are added through implied_phrases.
+    def __init__(self, rules):
+        self.rules = []
+        for rule in rules:
+            if ("include" in rule) == ("exclude" in rule):
+                raise ValueError(f"a classification rule needs either include or exclude phrases: {rule}")
+            extractor = rule.get("extractor", "message") if "include" in rule else None
+            if extractor is not None and extractor not in EXTRACTORS:
+                raise ValueError(f"unknown extractor {extractor}, use one of {EXTRACTORS}")
+            phrases = frozenset(phrase.upper() for phrase in rule.get("include", rule.get("exclude")))
+            self.rules.append((rule.get("priority", 0), phrases, extractor))
+        # sorted() is stable, so rules with the same priority keep their order
+        self.rules = sorted(self.rules, key=lambda rule: -rule[0])
+
+        all_phrases = sorted({phrase for _, phrases, _ in self.rules for phrase in phrases}, key=len, reverse=True)
+        self.implied_phrases = {phrase: frozenset(other for other in all_phrases if other in phrase)
+                                for phrase in all_phrases}
+        self.pattern = re.compile("(?=(" + "|".join(re.escape(phrase) for phrase in all_phrases) + "))",
+                                  re.IGNORECASE) if all_phrases else None
+
+    def find_phrases(self, message):
+        found_phrases = set()
+        if self.pattern is not None:
+            for match in self.pattern.finditer(message):
+                found_phrases.update(self.implied_phrases[match.group(1).upper()])
+        return found_phrases
+
+    # returns the extractor to run, None if the message doesn't blacklist anything
+    def classify(self, message):
+        found_phrases = self.find_phrases(message)
+        if not found_phrases:
+            return None
+        for _, phrases, extractor in self.rules:
+            if not phrases.isdisjoint(found_phrases):
+                return extractor
+        return None
+
+
+def load_classification_rules():
+    rules = dict(CLASSIFICATION_RULES)
+    path = Path(StatVars.path_classification_file)
+    if path.exists():
+        with path.open() as file:
+            rules.update(rapidjson.load(file, parse_mode=StatVars.CONFIG_PARSE_MODE))
+        logging.info(f"loaded classification rules for {', '.join(rules)} from {path}")
+    return rules
+
+
+def get_classifier(exchange):
+    classifier = StatVars.classifiers.get(exchange)
+    if classifier is None:
+        rules = load_classification_rules()
+        exchange_rules = rules.get(exchange, [])
+        while isinstance(exchange_rules, str):
+            exchange_rules = rules.get(exchange_rules, [])
+        classifier = Classifier(exchange_rules)
+        StatVars.classifiers[exchange] = classifier
+    return classifier
+
+
+# the same on every node, for the idempotency ledger
+def get_announcement_key(message_dict):
+    if message_dict.get("post_id") is not None:
+        return f"{message_dict['exchange']}/{message_dict['post_id']}"
+    return f"{message_dict['exchange']}/{message_dict['date']}"
+
+
+# (exchange, date, post id), see ProcessedStore.contains
+# the web scrapers share the markets and bot groups of their exchange
+def get_markets_exchange(exchange):
+    return exchange[:-len("_web")] if exchange.endswith("_web") else exchange
 
 
 def get_unique_identifier(message_dict):
-    unique_identifier = (message_dict.get("exchange"), message_dict.get("date"))
+    unique_identifier = (message_dict.get("exchange"), message_dict.get("date"), message_dict.get("post_id"))
     return unique_identifier
 
 
-def set_unique_identifiers():
-    StatVars.unique_identifiers = set(
-        (entry["exchange"], entry["date"]) for entry in StatVars.has_been_processed
-    )
-    pass
+def is_processed(message_dict):
+    return StatVars.processed_store.contains(*get_unique_identifier(message_dict))
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), query, ''))
+
+
+class PageCache:
+    # On-disk cache of fetched announcement pages (zlib compressed html) and the coins extracted from them,
+    # keyed by the normalized url. Entries expire after ttl_secs, the least recently used ones get evicted
+    # once all pages together exceed max_bytes.
+    def __init__(self, path, ttl_secs, max_bytes):
+        self.ttl_secs = ttl_secs
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    html BLOB,
+                    coins TEXT,
+                    finished INTEGER,
+                    fetched_at REAL,
+                    last_access REAL,
+                    size INTEGER
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+
+    def get(self, url):
+        url = normalize_url(url)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT html, coins, finished, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_secs is not None and now - row[3] > self.ttl_secs:
+                self.connection.execute("DELETE FROM pages WHERE url = ?", (url,))
+                return None
+            self.connection.execute("UPDATE pages SET last_access = ? WHERE url = ?", (now, url))
+        return {
+            "html": zlib.decompress(row[0]).decode(),
+            "coins": rapidjson.loads(row[1]),
+            "finished": bool(row[2]),
+            "fetched_at": row[3],
+        }
+
+    def put(self, url, html_source, coins, finished):
+        html = zlib.compress(html_source.encode(), 6)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (url, html, coins, finished, fetched_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), html, rapidjson.dumps(list(coins)), int(finished), now, now, len(html)))
+            self.evict()
+
+    # call with the lock held, inside a transaction
+    def evict(self):
+        total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        for url, size in self.connection.execute("SELECT url, size FROM pages ORDER BY last_access").fetchall():
+            self.connection.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total_size -= size
+            if total_size <= self.max_bytes:
+                break
+
+
+def get_page_cache():
+    with StatVars.process_lock:
+        if StatVars.page_cache is None:
+            StatVars.page_cache = PageCache(StatVars.path_page_cache, StatVars.page_cache_ttl_secs,
+                                            StatVars.page_cache_max_bytes)
+    return StatVars.page_cache
+
+
+class ProcessedStore:
+    # Append-only sqlite store of every scraped message.
+    # Saving only inserts the new messages in one transaction. Messages are identified by their telegram post id
+    # (unique per exchange), messages without one (legacy imports) by their date. source is NULL for scraped
+    # messages and 'push' for the ones pushed to POST /ingest, only scraped ones count for the warm start.
+    # export_json() still writes the legacy processed.json.
+    schema_version = 3
+    legacy_fields = ["exchange", "date", "date_scraped", "message", "linked_urls", "blacklisted_pairs"]
+    create_table = """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            exchange TEXT NOT NULL,
+            date TEXT NOT NULL,
+            post_id INTEGER,
+            date_scraped TEXT,
+            message TEXT,
+            linked_urls TEXT,
+            blacklisted_pairs TEXT,
+            source TEXT
+        )"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.migrate()
+        # exchange -> highest scraped post id in the store (high-water mark), loaded on first use
+        self.newest_post_ids = {}
+
+    def migrate(self):
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.schema_version:
+            return
+        with self.connection:
+            if version == 0:
+                self.connection.execute(self.create_table.format(name="processed"))
+            elif version == 1:
+                # version 1 was unique on (exchange, date), two posts in the same second collided.
+                # sqlite can't drop a table constraint, so the table gets copied (the ids stay the same)
+                logging.info(f"migrating {self.path} to schema version {self.schema_version}")
+                self.connection.execute(self.create_table.format(name="processed_new"))
+                self.connection.execute("INSERT INTO processed_new (id, exchange, date, post_id, date_scraped, "
+                                        "message, linked_urls, blacklisted_pairs) SELECT id, exchange, date, "
+                                        "post_id, date_scraped, message, linked_urls, blacklisted_pairs "
+                                        "FROM processed ORDER BY id")
+                self.connection.execute("DROP TABLE processed")
+                self.connection.execute("ALTER TABLE processed_new RENAME TO processed")
+            else:
+                # version 2 didn't tell pushed messages from scraped ones, all of them were scraped
+                logging.info(f"migrating {self.path} to schema version {self.schema_version}")
+                self.connection.execute("ALTER TABLE processed ADD COLUMN source TEXT")
+            self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS processed_post_id "
+                                    "ON processed (exchange, post_id) WHERE post_id IS NOT NULL")
+            self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS processed_date "
+                                    "ON processed (exchange, date) WHERE post_id IS NULL")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS processed_exchange_date ON processed (exchange, date)")
+            self.connection.execute(f"PRAGMA user_version = {self.schema_version}")
+
+    # a message with a post id is known by it, or by its date as long as it is a legacy row without a post id.
+    # scraped_only ignores the pushed messages
+    def contains(self, exchange, date, post_id=None, scraped_only=False):
+        source_filter = " AND source IS NULL" if scraped_only else ""
+        with self.lock:
+            if post_id is None:
+                query, params = (f"SELECT 1 FROM processed WHERE exchange = ? AND date = ?{source_filter}",
+                                 (exchange, date))
+            else:
+                query, params = (f"SELECT 1 FROM processed WHERE exchange = ? AND post_id = ?{source_filter} "
+                                 f"UNION ALL SELECT 1 FROM processed WHERE exchange = ? AND date = ? "
+                                 f"AND post_id IS NULL{source_filter}",
+                                 (exchange, post_id, exchange, date))
+            return self.connection.execute(query, params).fetchone() is not None
+
+    def get_oldest_date(self, exchange):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT MIN(date) FROM processed WHERE exchange = ?", (exchange,)).fetchone()[0]
+
+    def get_oldest_post_id(self, exchange):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT MIN(post_id) FROM processed WHERE exchange = ?", (exchange,)).fetchone()[0]
+
+    def count_since(self, exchange, date):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM processed WHERE exchange = ? AND date >= ?", (exchange, date)).fetchone()[0]
+
+    # hour of the day (UTC) -> count of the messages of an exchange that blacklisted pairs
+    def get_delisting_hours(self, exchange):
+        with self.lock:
+            return dict(self.connection.execute(
+                "SELECT CAST(substr(date, 12, 2) AS INTEGER), COUNT(*) FROM processed "
+                "WHERE exchange = ? AND blacklisted_pairs != '[]' GROUP BY 1", (exchange,)).fetchall())
+
+    def get_newest_post_id(self, exchange):
+        with self.lock:
+            if exchange not in self.newest_post_ids:
+                self.newest_post_ids[exchange] = self.connection.execute(
+                    "SELECT MAX(post_id) FROM processed WHERE exchange = ? AND source IS NULL",
+                    (exchange,)).fetchone()[0]
+            return self.newest_post_ids[exchange]
+
+    def count(self, exchange=None):
+        with self.lock:
+            if exchange is None:
+                return self.connection.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+            return self.connection.execute("SELECT COUNT(*) FROM processed WHERE exchange = ?",
+                                           (exchange,)).fetchone()[0]
+
+    # returns how many messages were new
+    def add(self, message_dicts):
+        rows = [(message_dict["exchange"], message_dict["date"], message_dict.get("post_id"),
+                 message_dict.get("date_scraped"), message_dict.get("message"),
+                 rapidjson.dumps(message_dict.get("linked_urls", [])),
+                 rapidjson.dumps(list(message_dict.get("blacklisted_pairs", []))), message_dict.get("source"))
+                for message_dict in message_dicts]
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            adopted = 0
+            for row in rows:
+                if row[2] is not None:
+                    # a legacy row of the same message (same date, no post id yet) takes over the post id
+                    adopted += self.connection.execute(
+                        "UPDATE processed SET post_id = ? WHERE exchange = ? AND date = ? AND post_id IS NULL",
+                        (row[2], row[0], row[1])).rowcount
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO processed "
+                "(exchange, date, post_id, date_scraped, message, linked_urls, blacklisted_pairs, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            for row in rows:
+                if row[2] is not None and row[7] is None and row[0] in self.newest_post_ids:
+                    self.newest_post_ids[row[0]] = max(self.newest_post_ids[row[0]] or 0, row[2])
+            return self.connection.total_changes - before - adopted
+
+    # streams the messages sorted like the legacy processed.json, or in the order they were stored (by_id).
+    # Every chunk is fetched under the lock and continues after the last row of the previous one, so the live bot
+    # (export_processed_on_save) keeps writing in between
+    def iter_messages(self, exchange=None, by_id=False, chunk_size=1000):
+        sort_columns = ["id"] if by_id else ["exchange", "date", "IFNULL(post_id, -1)", "id"]
+        sort_key = ", ".join(sort_columns)
+        sort_key_size = len(sort_columns)
+        last_sort_key = None
+        while True:
+            conditions = []
+            params = []
+            if exchange is not None:
+                conditions.append("exchange = ?")
+                params.append(exchange)
+            if last_sort_key is not None:
+                conditions.append(f"({sort_key}) > ({', '.join('?' * sort_key_size)})")
+                params.extend(last_sort_key)
+            query = (f"SELECT {sort_key}, exchange, date, post_id, date_scraped, message, linked_urls, "
+                     f"blacklisted_pairs, source FROM processed")
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += f" ORDER BY {sort_key} LIMIT {int(chunk_size)}"
+            with self.lock:
+                rows = self.connection.execute(query, params).fetchall()
+            for row in rows:
+                row = row[sort_key_size:]
+                yield {
+                    "exchange": row[0],
+                    "date": row[1],
+                    "post_id": row[2],
+                    "date_scraped": row[3],
+                    "message": row[4],
+                    "linked_urls": rapidjson.loads(row[5]) if row[5] else [],
+                    "blacklisted_pairs": rapidjson.loads(row[6]) if row[6] else [],
+                    "source": row[7],
+                }
+            if len(rows) < chunk_size:
+                return
+            last_sort_key = rows[-1][:sort_key_size]
+
+    def import_json(self, path):
+        with Path(path).open() if path != '-' else sys.stdin as file:
+            message_dicts = rapidjson.load(file, parse_mode=StatVars.CONFIG_PARSE_MODE)
+        return self.add(message_dicts)
+
+    # writes the legacy processed.json (same format as before) atomically
+    def export_json(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            outfile.write("[")
+            for index, message_dict in enumerate(self.iter_messages()):
+                legacy_dict = {field: message_dict[field] for field in self.legacy_fields}
+                entry = rapidjson.dumps(legacy_dict, indent=4).replace("\n", "\n    ")
+                outfile.write(("," if index > 0 else "") + "\n    " + entry)
+            outfile.write("\n]")
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
 
 
 class BinanceScraper:
@@ -127,6 +1426,8 @@ class BinanceScraper:
 
     initialScrollUpTimes = 200
     initialWaitSeconds = 0
+    # False for sources that fetch on their own (ApiScraper), their jobs get neither a browser nor a page fetcher
+    needs_page_fetcher = True
 
     message_bubble = "tgme_widget_message_wrap"
     message_text = ["tgme_widget_message_text"]
@@ -134,71 +1435,112 @@ class BinanceScraper:
                     "class": "tgme_widget_message_date",
                     "format": "%Y-%m-%dT%H:%M:%S%z"}
     pairs = None
+    # parsed message bubbles of the current scrape, oldest first
+    messages = []
+    # newest scraped post id when the scrape started (warm start), None scrolls the classic way
+    last_post_id = None
+    # fetch backend of the current scrape or backfill
+    driver = None
 
-    def scrape(self, pairs):
+    def scrape(self, pairs, driver=None):
         self.pairs = pairs
-
-        StatVars.driver.get(self.url)
-        time.sleep(self.initialWaitSeconds)
+        # every scrape job brings its own fetch backend, StatVars.driver is only the fallback
+        driver = driver if driver is not None else StatVars.driver
+        self.driver = driver
+
+        # newest post id that was handled already: the newest scraped one in the store or on the page of the last
+        # scrape (posts without text never make it into the store). Pushed posts don't count, the poller may not
+        # have seen the posts before them yet
+        high_water_mark = max((post_id for post_id in (StatVars.processed_store.get_newest_post_id(self.exchange),
+                                                       StatVars.seen_post_ids.get(self.exchange))
+                               if post_id is not None), default=None)
+        self.last_post_id = high_water_mark if StatVars.warm_start else None
+
+        with timed_stage("page_load"):
+            driver.get(self.url)
+            time.sleep(self.initialWaitSeconds)
+
+        # nothing new on the channel: skip parsing, classification and persisting altogether
+        newest_post_id = get_newest_page_post_id(driver.page_source)
+        if newest_post_id is not None and high_water_mark is not None and newest_post_id <= high_water_mark:
+            StatVars.metrics.inc("delist_unchanged_polls_total", exchange=self.exchange)
+            return
 
         for_loops_count = 0
         prev_message_count = 0
         # scan once without scrolling to have the loop faster if we just need to scrape the first 20 ish messages
-        messages, prev_message_count, stop_loop = self.read_messages(StatVars.driver, prev_message_count, True)
-        current_scroll_up_times = self.initialScrollUpTimes
+        messages, prev_message_count, stop_loop = self.read_messages(driver, prev_message_count, True)
         if self.initialScrollUpTimes > 0:
             while not stop_loop:
+                current_scroll_up_times = self.get_scroll_up_times(messages)
                 # scrolling several times to make the overall loop faster, uses tqdm for a progression bar
-                for _ in tqdm(range(current_scroll_up_times), desc=f"Scrolling up to fetch more news for "
-                                                                   f"{self.exchange}", unit="scroll"):
-                    StatVars.driver.execute_script("window.scrollTo(0, 0);")
-                    time.sleep(StatVars.scrollUpSleepTime)
-                    for_loops_count += 1
-                messages, prev_message_count, stop_loop = self.read_messages(StatVars.driver, prev_message_count)
+                with timed_stage("scroll"):
+                    for _ in tqdm(range(current_scroll_up_times), desc=f"Scrolling up to fetch more news for "
+                                                                       f"{self.exchange}", unit="scroll"):
+                        for_loops_count += 1
+                        if not scroll_up(driver):
+                            break
+                messages, prev_message_count, stop_loop = self.read_messages(driver, prev_message_count)
                 # stop_loop = True  # enable for quicker debugging, so it only scrolls for one rotation
-        # now fill the message_html
-        for message_html in messages[::-1]:
-            prepared_message_dict = self.prepare_message_dict(message_html)
-            message_dict = self.read_message(prepared_message_dict)
+        # now fill the message_html, only the messages that are new get prepared and classified
+        with timed_stage("classify"):
+            to_be_processed = list(self.iter_new_messages(messages))
 
-            if message_dict['message'] == "":
-                continue
-            elif get_unique_identifier(message_dict) in StatVars.unique_identifiers:
-                # logging.info(f"message already exists for exchange {message_dict['exchange']}: "
-                #              f"{message_dict['message']}")
-                break
-            else:
-                StatVars.to_be_processed.append(message_dict)
-
-        if len(StatVars.to_be_processed) > 0:
-            StatVars.has_been_processed.extend(StatVars.to_be_processed)
-            report_to_be_processed()
-            save_processed()
-
-        # make one big list of newly delisted pairs
-        new_blacklist = []
-        for message_dict in StatVars.to_be_processed:
-            if message_dict is None:
-                continue
-            new_blacklist.extend(message_dict["blacklisted_pairs"])
-
-        if len(new_blacklist) > 0:
-            save_blacklist(self.exchange, new_blacklist)
-            send_blacklists()
-            # only do this if the bot didn't initially gather (or: just react on fresh news)
-            if for_loops_count == 0:
-                send_force_exit_long()
-                send_force_enter_short()
-
-        reset_static_variables()
+        # only react with force orders if the bot didn't initially gather (or: just react on fresh news)
+        process_new_messages(self.exchange, to_be_processed, fresh=for_loops_count == 0)
+        if newest_post_id is not None:
+            StatVars.seen_post_ids[self.exchange] = newest_post_id
 
         # logging.info(f"successfully ran through {self.exchange}.scrape()")
 
+    # Walks the channel history backwards in batches of backfill_batch_scrolls scrolls. Every batch is persisted
+    # right away and then dropped by reloading the page before its oldest post, so memory stays flat no matter
+    # how long the history is. Resumes below the oldest post id in the store, e.g. after a crash.
+    def backfill(self, pairs, driver):
+        self.pairs = pairs
+        self.driver = driver
+        before_post_id = StatVars.processed_store.get_oldest_post_id(self.exchange)
+        if before_post_id is not None:
+            logging.info(f"{self.exchange}: resuming the backfill before post {before_post_id}")
+
+        messages_count = 0
+        while True:
+            driver.get(self.url if before_post_id is None else f"{self.url}?before={before_post_id}")
+            time.sleep(self.initialWaitSeconds)
+            has_more = True
+            for _ in range(StatVars.backfill_batch_scrolls):
+                if not scroll_up(driver):
+                    has_more = False
+                    break
+
+            batch = self.extract_new_messages(driver)
+            if not batch:
+                break
+            to_be_processed = []
+            for message_html in reversed(batch):
+                message_dict = self.prepare_message_dict(message_html)
+                if message_dict['message'] != "" and not is_processed(message_dict):
+                    to_be_processed.append(self.read_message(message_dict))
+            process_new_messages(self.exchange, to_be_processed, fresh=False)
+
+            messages_count += len(batch)
+            oldest_post_id = self.extract_post_id(batch[0])
+            logging.info(f"{self.exchange}: backfilled {messages_count} messages, "
+                         f"{len(to_be_processed)} new in this batch, oldest post is {oldest_post_id}")
+            if oldest_post_id is None or not has_more or (
+                    before_post_id is not None and oldest_post_id >= before_post_id):
+                break
+            before_post_id = oldest_post_id
+        logging.info(f"{self.exchange}: backfill finished after {messages_count} messages")
+
     def read_messages(self, read_messages_driver, prev_message_count, first_try=False):
         stop_loop = False
-        html_source = read_messages_driver.page_source
-        soup = BeautifulSoup(html_source, "html.parser")
-        messages = soup.find_all("div", class_=self.message_bubble)
+        if first_try:
+            self.messages = []
+        # only parse what got loaded since the last round, scrolling up loads older messages, so they go in front
+        with timed_stage("parse"):
+            self.messages = self.extract_new_messages(read_messages_driver) + self.messages
+        messages = self.messages
 
         len_messages = len(messages)
         if len_messages == 0:
@@ -206,10 +1548,7 @@ class BinanceScraper:
                              f"Aborting for this loop... "
                              f"(if this doesnt happen multiple times in a row then you can ignore this message)")
 
-        message_dict = self.prepare_message_dict(messages[0])
-        unique_identifier = (message_dict.get("exchange"), message_dict.get("date"))
-
-        if unique_identifier in StatVars.unique_identifiers:
+        if self.is_known(messages[0]):
             if not first_try:
                 StatVars.logger.info(
                     f"{self.exchange}: We found a message that has already been scraped. "
@@ -229,28 +1568,72 @@ class BinanceScraper:
 
         return messages, len_messages, stop_loop
 
+    # newest message first, stops at the first message that is already known
+    def iter_new_messages(self, messages):
+        for message_html in reversed(messages):
+            if self.is_known(message_html):
+                # everything older than this is known as well
+                break
+            if StatVars.processed_store.contains(*self.peek_unique_identifier(message_html)):
+                # pushed to POST /ingest already, the posts before it may still be missing
+                continue
+            message_dict = self.prepare_message_dict(message_html)
+            if message_dict['message'] == "":
+                continue
+            yield self.read_message(message_dict)
+
+    # With a warm start everything up to the newest scraped post counts as known, even posts without text that
+    # never made it into the store. Otherwise (or without post ids) the message has to be in the store as a
+    # scraped one, a pushed message says nothing about the posts before it.
+    def is_known(self, message_html):
+        if self.last_post_id is not None:
+            post_id = self.extract_post_id(message_html)
+            if post_id is not None:
+                return post_id <= self.last_post_id
+        return StatVars.processed_store.contains(*self.peek_unique_identifier(message_html), scraped_only=True)
+
+    # With a warm start the gap between the oldest loaded post and the newest stored post tells how many scrolls
+    # are missing, so a restart doesn't scroll initialScrollUpTimes times just to find the first known message.
+    def get_scroll_up_times(self, messages):
+        if self.last_post_id is None or not messages:
+            return self.initialScrollUpTimes
+        oldest_post_id = self.extract_post_id(messages[0])
+        if oldest_post_id is None:
+            return self.initialScrollUpTimes
+        missing_messages = oldest_post_id - self.last_post_id
+        # one scroll extra for deleted posts and posts that loaded short
+        scroll_up_times = -(-missing_messages // StatVars.messages_per_scroll) + 1
+        return max(1, min(scroll_up_times, self.initialScrollUpTimes))
+
+    # same as get_unique_identifier(self.prepare_message_dict(message_html)) without the text cleaning
+    def peek_unique_identifier(self, message_html):
+        return (self.exchange, self.extract_datetime(message_html).strftime(StatVars.datetimeFormat),
+                self.extract_post_id(message_html))
+
+    def extract_new_messages(self, read_messages_driver):
+        html_source = get_new_bubbles_html(read_messages_driver, self.message_bubble)
+        if not html_source:
+            return []
+        # the strainer sees the raw class attribute, so match the class as a whole word in there
+        bubble_class = re.compile(rf'(^|\s){re.escape(self.message_bubble)}(\s|$)')
+        soup = BeautifulSoup(html_source, StatVars.html_parser, parse_only=SoupStrainer("div", class_=bubble_class))
+        return soup.find_all("div", class_=self.message_bubble)
+
     def read_message(self, message_dict):
         if message_dict is None:
             return None
 
-        delist_string = "BINANCE WILL DELIST "
-        if "Binance Will Delist All ".upper() in message_dict['message'].upper():
-            delist_string = "Binance Will Delist All "
-        if "Binance Will Delist StableUSD".upper() in message_dict['message'].upper():
-            pass
-        elif "Binance Will Delist All FTX Leveraged Tokens".upper() in message_dict['message'].upper():
-            pass
-        elif "Binance Will Delist FTT Margin Pairs".upper() in message_dict['message'].upper():
-            pass
-        elif "DERIVATIVE".upper() in message_dict['message'].upper():
-            pass
-        elif delist_string.upper() in message_dict['message'].upper():
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            if arr_coins is not []:
-                message_dict['blacklisted_pairs'].extend(arr_coins)
-
+        extractor = get_classifier(self.exchange).classify(message_dict['message'])
+        if extractor is not None:
+            with timed_stage("match"):
+                message_dict['blacklisted_pairs'].extend(self.extract_coins(extractor, message_dict))
         return message_dict
 
+    def extract_coins(self, extractor, message_dict):
+        if extractor == "message":
+            return self.get_blacklisted_coins(message_dict['message'])
+        raise ValueError(f"{self.exchange}: the extractor {extractor} is not supported by {type(self).__name__}")
+
     # This was changed to specifically looking for prefixes since a pair W and T was blacklisted, which would
     # blacklist all pairs ending on a T or W which ... sucks
     def get_blacklisted_coins(self, title: str):
@@ -273,12 +1656,10 @@ class BinanceScraper:
         set_title = set(my_title.strip().split(" "))
         set_title_no_trailing_slash = [word.split('/')[0] for word in set_title]
 
-        # prepare variables
-        all_coins = {pair['id'].upper().replace("-", "") for pair in self.pairs.values()}
-        all_coins.update({pair['base'].upper() for pair in self.pairs.values()})
+        symbol_index = self.get_symbol_index()
 
         # Use list comprehension to build the set of coins directly
-        set_coins = {coin for coin in set_title_no_trailing_slash if coin.upper() in all_coins}
+        set_coins = {coin for coin in set_title_no_trailing_slash if coin.upper() in symbol_index.coins}
 
         if len(set_coins) == 0:
             # report any news that did not contain a pair to be blacklisted
@@ -291,25 +1672,15 @@ class BinanceScraper:
             pattern_coin_itself = f"{set_coin}/.*"
             caught_coins.add(pattern_coin_itself)
 
-            # Check all combinations of prefixes and suffixes
-            for prefix in self.coin_prefixes:
-                for suffix in self.coin_suffixes:
-                    # Construct potential coin combinations
-                    potential_coin_combo = f"{prefix}{set_coin}{suffix}".upper()
-                    potential_coin_prefix = f"{prefix}{set_coin}".upper()
-                    potential_coin_suffix = f"{set_coin}{suffix}".upper()
-
-                    # Check if any of these patterns match 'base' values in self.pairs
-                    for pair_key, pair_value in self.pairs.items():
-                        if 'base' in pair_value:
-                            base_value = pair_value['base'].upper()
-                            if (fnmatch.fnmatch(base_value, potential_coin_combo) or
-                                    fnmatch.fnmatch(base_value, potential_coin_prefix) or
-                                    fnmatch.fnmatch(base_value, potential_coin_suffix)):
-                                caught_coins.add(base_value)
+            # Add all bases that are the coin combined with any prefix and/or suffix
+            caught_coins.update(symbol_index.derivatives.get(set_coin.upper(), ()))
 
         return caught_coins
 
+    def get_symbol_index(self):
+        return get_symbol_index(get_markets_exchange(self.exchange), self.pairs, self.coin_prefixes,
+                                self.coin_suffixes)
+
     def prepare_message_dict(self, message_html):
         message_text_elements = []
         for div in self.message_text:
@@ -322,6 +1693,28 @@ class BinanceScraper:
         else:
             stripped_message = ""
 
+        return self.build_message_dict(stripped_message, self.extract_datetime(message_html),
+                                       self.extract_post_id(message_html))
+
+    # an announcement pushed to POST /ingest: {"message": ..., "date": optional, "post_id": optional,
+    # "linked_urls": optional}, without a date it counts as posted right now
+    def prepare_pushed_message_dict(self, payload):
+        if not isinstance(payload, dict) or not isinstance(payload.get('message'), str):
+            raise ValueError(f"an announcement needs a message: {payload}")
+        if payload.get('date'):
+            msg_datetime = parse_date(payload['date'])
+        else:
+            msg_datetime = datetime.now(timezone.utc).replace(microsecond=0)
+        post_id = payload.get('post_id')
+        message_dict = self.build_message_dict(payload['message'].strip(), msg_datetime,
+                                               int(post_id) if post_id is not None else None)
+        for url in payload.get('linked_urls') or []:
+            if url not in message_dict['linked_urls']:
+                message_dict['linked_urls'].append(url)
+        message_dict['source'] = "push"
+        return message_dict
+
+    def build_message_dict(self, stripped_message, msg_datetime, post_id):
         # Remove non-logging.infoable characters and multiple whitespaces
         message_content = re.sub(r'[^\x00-\x7F]+', ' ', stripped_message)
         message_content = re.sub(r'\s+', ' ', message_content)
@@ -330,13 +1723,12 @@ class BinanceScraper:
         # Replace double quotes with single quotes to not have to have \" in the strings and keep the quotes
         message_content = message_content.replace('"', "'")
 
-        msg_datetime = self.extract_datetime(message_html)
-
         urls = re.findall(r'\bhttps://\S+', message_content, re.IGNORECASE)
 
         message_dict = {
             "exchange": self.exchange,
             "date": msg_datetime.strftime(StatVars.datetimeFormat),
+            "post_id": post_id,
             "date_scraped": datetime.now(timezone.utc).strftime(StatVars.datetimeFormat),
             "message": message_content,
             "linked_urls": urls,
@@ -354,6 +1746,14 @@ class BinanceScraper:
         msg_datetime = datetime.strptime(datetime_html.contents[0].attrs['datetime'], self.message_date['format'])
         return msg_datetime
 
+    # telegram: <div class="tgme_widget_message" data-post="<channel>/<post id>">, None for other sources
+    def extract_post_id(self, message_html):
+        post_html = message_html.find(attrs={"data-post": True})
+        if post_html is None:
+            return None
+        post_id = post_html['data-post'].rsplit('/', 1)[-1]
+        return int(post_id) if post_id.isdigit() else None
+
 
 class KucoinScraper(BinanceScraper):
     def __init__(self):
@@ -364,29 +1764,12 @@ class KucoinScraper(BinanceScraper):
     coin_prefixes = ["000"]
     coin_suffixes = ["2L", "2S", "3L", "3S", "DOWN", "UP"]
 
-    def read_message(self, message_dict):
-        if message_dict is None:
-            return None
-
-        if "DAILY REPORT".upper() in message_dict['message'].upper():
-            pass
-        elif "KuCoin Will Delist the Sandbox Mode".upper() in message_dict['message'].upper():
-            pass
-        elif "DERIVATIVE".upper() in message_dict['message'].upper():
-            pass
-        elif "KuCoin Will Delist Certain Projects".upper() in message_dict['message'].upper():
+    def extract_coins(self, extractor, message_dict):
+        if extractor == "news_page":
             # found an indirect reference of pairs, searching...
             found_subpage_coins = self.read_message_of_news(message_dict['linked_urls'])
-            arr_coins = self.get_blacklisted_coins(found_subpage_coins)
-            message_dict['blacklisted_pairs'].extend(arr_coins)
-        elif (
-                "KUCOIN WILL DELIST THE".upper() in message_dict['message'].upper() or
-                "WILL BE REMOVED FROM THE EXCHANGE".upper() in message_dict['message'].upper() or
-                "RISK ANNOUNCEMENT".upper() in message_dict['message'].upper() or
-                "WILL BE DELISTED FROM KUCOIN".upper() in message_dict['message'].upper()):
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            message_dict['blacklisted_pairs'].extend(arr_coins)
-        return message_dict
+            return self.get_blacklisted_coins(found_subpage_coins)
+        return super().extract_coins(extractor, message_dict)
 
     def read_message_of_news(self, urls):
         found_messages = []
@@ -394,36 +1777,64 @@ class KucoinScraper(BinanceScraper):
             # If another website is stated here, then skip it. In the end we don't want to risk false positives
             if "https://www.kucoin.com/announcement" not in url:
                 continue
-            own_driver = set_driver()
-
-            own_driver.get(url.split('#')[0])
-            html_source = own_driver.page_source
-            soup = BeautifulSoup(html_source, "html.parser")
-            articles = soup.find_all("div")
-
-            # we already know that the pairs names are surrounded by ( and )
-            # so we just have to find those words and remove ( and )
-
-            collecting = False
-            for article in articles:
-                paragraphs = article.find_all("p")
-                for paragraph in paragraphs:
-                    txt = paragraph.get_text(separator=" ", strip=True)
-                    if txt == '':
-                        pass
-                    elif re.match(r'^\d+\.', txt):  # Paragraph starts with a number followed by a period
-                        collecting = True
-                        hits = re.findall(r'\(\w+\)', txt)
-                        found_messages.extend(hit.strip('()') for hit in hits)
-                    elif collecting:
-                        if not re.match(r'^\d+\.', txt):  # Paragraph does not start with a number
-                            return " ".join(found_messages)
-                        found_messages.append(txt)
-            own_driver.quit()
-            own_driver = None
+            cached_page = get_page_cache().get(url)
+            if cached_page is not None:
+                page_messages, finished = cached_page['coins'], cached_page['finished']
+            elif StatVars.page_cache_only:
+                logging.warning(f"{url} is not cached, skipping it (page_cache_only)")
+                continue
+            else:
+                with timed_stage("news_page"), self.lease_news_driver() as news_driver:
+                    news_driver.get(url.split('#')[0])
+                    html_source = news_driver.page_source
+                page_messages, finished = self.extract_news_coins(html_source)
+                # an empty page is more likely a failed render than an announcement, fetch it again next time
+                if page_messages or finished:
+                    get_page_cache().put(url, html_source, page_messages, finished)
+            found_messages.extend(page_messages)
+            if finished:
+                return " ".join(found_messages)
         # return a space separated string of those found words
         return ""
 
+    # A browser scrape reads the announcement pages with its own browser: the channel page is parsed already and
+    # gets loaded again next time. Leasing a second one while holding the first would wait forever once every
+    # driver is held by a scrape job (always with max_drivers = 1)
+    @contextmanager
+    def lease_news_driver(self):
+        if self.driver is not None and not isinstance(self.driver, HttpPageFetcher):
+            yield self.driver
+        else:
+            with StatVars.driver_pool.lease() as driver:
+                yield driver
+
+    # returns the coins listed on a kucoin announcement page and whether the list ended on that page
+    @staticmethod
+    def extract_news_coins(html_source):
+        found_messages = []
+        soup = BeautifulSoup(html_source, "html.parser")
+        articles = soup.find_all("div")
+
+        # we already know that the pairs names are surrounded by ( and )
+        # so we just have to find those words and remove ( and )
+
+        collecting = False
+        for article in articles:
+            paragraphs = article.find_all("p")
+            for paragraph in paragraphs:
+                txt = paragraph.get_text(separator=" ", strip=True)
+                if txt == '':
+                    pass
+                elif re.match(r'^\d+\.', txt):  # Paragraph starts with a number followed by a period
+                    collecting = True
+                    hits = re.findall(r'\(\w+\)', txt)
+                    found_messages.extend(hit.strip('()') for hit in hits)
+                elif collecting:
+                    if not re.match(r'^\d+\.', txt):  # Paragraph does not start with a number
+                        return found_messages, True
+                    found_messages.append(txt)
+        return found_messages, False
+
 
 class BybitScraper(BinanceScraper):
     def __init__(self):
@@ -435,27 +1846,6 @@ class BybitScraper(BinanceScraper):
     exchange = "bybit"
     url = "https://t.me/s/Bybit_Announcements"
 
-    def read_message(self, message_dict):
-        if message_dict is None:
-            return None
-
-        if "Contact".upper() in message_dict['message'].upper():
-            pass
-        if "Perpetual".upper() in message_dict['message'].upper():
-            pass
-        if "Margin".upper() in message_dict['message'].upper():
-            pass
-        if "DERIVAT".upper() in message_dict['message'].upper():
-            pass
-        if "CONTRACT".upper() in message_dict['message'].upper():
-            pass
-        elif (
-                "Delisting of".upper() in message_dict['message'].upper()):
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            if arr_coins is not []:
-                message_dict['blacklisted_pairs'].extend(arr_coins)
-        return message_dict
-
 
 class OkxScraper(BinanceScraper):
     def __init__(self):
@@ -467,21 +1857,6 @@ class OkxScraper(BinanceScraper):
     exchange = "okx"
     url = "https://t.me/s/OKXAnnouncements"
 
-    def read_message(self, message_dict):
-        if message_dict is None:
-            return None
-
-        if "Contact".upper() in message_dict['message'].upper():
-            pass
-        elif "DERIVATIVE".upper() in message_dict['message'].upper():
-            pass
-        elif (
-                "Delisting of".upper() in message_dict['message'].upper()):
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            if arr_coins is not []:
-                message_dict['blacklisted_pairs'].extend(arr_coins)
-        return message_dict
-
 
 class GateioScraper(BinanceScraper):
     def __init__(self):
@@ -494,23 +1869,6 @@ class GateioScraper(BinanceScraper):
     url = "https://t.me/s/GateioOfficialNews"
 
 
-
-    def read_message(self, message_dict):
-        if message_dict is None:
-            return None
-
-        if "Contact".upper() in message_dict['message'].upper():
-            pass
-        if "DERIVATIVE".upper() in message_dict['message'].upper():
-            pass
-        elif (
-                "Delist".upper() in message_dict['message'].upper()):
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            if arr_coins is not []:
-                message_dict['blacklisted_pairs'].extend(arr_coins)
-        return message_dict
-
-
 class HtxScraper(BinanceScraper):
     def __init__(self):
         super().__init__()
@@ -521,76 +1879,129 @@ class HtxScraper(BinanceScraper):
     exchange = "htx"
     url = "https://t.me/htxglobalofficial"
 
-    def read_message(self, message_dict):
-        if message_dict is None:
-            return None
 
-        if "Contact".upper() in message_dict['message'].upper():
-            pass
-        if "DERIVATIVE".upper() in message_dict['message'].upper():
-            pass
-        elif (
-                "Delist".upper() in message_dict['message'].upper()):
-            arr_coins = self.get_blacklisted_coins(message_dict['message'])
-            if arr_coins is not []:
-                message_dict['blacklisted_pairs'].extend(arr_coins)
-        return message_dict
+class ApiScraper:
+    # Mixin for the announcement lists of the exchange websites: one json request instead of a rendered page,
+    # conditional (ETag/If-Modified-Since), so an unchanged list costs a 304. Every new article becomes a message
+    # with the article id as post id and its url as linked url, then goes through read_message like a telegram post.
+    # Subclasses set api_url/api_params and implement get_articles (json -> list) and get_article (-> title,
+    # summary, datetime, id, url)
+    needs_page_fetcher = False
+    api_url = None
+    api_params = {}
 
+    def scrape(self, pairs, driver=None):
+        self.pairs = pairs
+        with timed_stage("page_load"):
+            data, validators = fetch_json_if_changed(self.api_url, self.api_params)
+        if data is None:
+            StatVars.metrics.inc("delist_unchanged_polls_total", exchange=self.exchange)
+            return
+
+        with timed_stage("parse"):
+            message_dicts = []
+            for article in self.get_articles(data):
+                title, summary, msg_datetime, article_id, article_url = self.get_article(article)
+                stripped_message = " _-_ ".join(text.strip() for text in (title, summary) if text)
+                message_dict = self.build_message_dict(stripped_message, msg_datetime, article_id)
+                if article_url not in message_dict['linked_urls']:
+                    message_dict['linked_urls'].append(article_url)
+                message_dicts.append(message_dict)
+            # newest first, like process_new_messages expects it
+            message_dicts.sort(key=lambda message_dict: parse_date(message_dict['date']), reverse=True)
+
+        # the very first poll only gathers what's listed already, like the initial telegram scrape
+        known_source = StatVars.processed_store.count(self.exchange) > 0
+        to_be_processed = []
+        with timed_stage("classify"):
+            for message_dict in message_dicts:
+                if message_dict['message'] == "" or is_processed(message_dict):
+                    continue
+                to_be_processed.append(self.read_message(message_dict))
+        if known_source:
+            old_messages, fresh_messages = split_fresh_news(to_be_processed)
+        else:
+            old_messages, fresh_messages = to_be_processed, []
 
-class KucoinScraperWeb(KucoinScraper):
+        process_new_messages(self.exchange, old_messages, fresh=False)
+        process_new_messages(self.exchange, fresh_messages, fresh=True)
+        remember_http_validators(self.api_url, validators)
+
+
+class KucoinScraperWeb(ApiScraper, KucoinScraper):
     def __init__(self):
         super().__init__()
 
     exchange = "kucoin_web"
     url = "https://www.kucoin.com/announcement"
+    api_url = "https://www.kucoin.com/_api/cms/articles"
+    api_params = {"page": 1, "pageSize": 20, "category": "delistings", "lang": "en_US"}
 
-    initialScrollUpTimes = 0
-    initialWaitSeconds = 5
+    def get_articles(self, data):
+        return (data.get("data") or data).get("items") or []
 
-    message_bubble = "css-jwocck"
-    message_text = ["css-hr7j2u", "css-x0bekk"]
-    message_date = {"type": "p",
-                    "class": "css-121ce2o",
-                    "format": "%m/%d/%Y, %H:%M:%S"}
-
-    def extract_datetime(self, message_html):
-        if self.message_date['format'] == "":
-            return datetime(1970, 1, 1)  # Return a default datetime object
-        datetime_html = message_html.find(self.message_date['type'], class_=self.message_date['class'])
-        msg_datetime = datetime.strptime(datetime_html.contents[0], self.message_date['format'])
-        return msg_datetime
+    # publish times come as unix seconds (first_publish_at/publish_at), the path is relative to /announcement
+    def get_article(self, article):
+        published = article.get("first_publish_at") or article.get("publish_at")
+        msg_datetime = datetime.fromtimestamp(int(published), timezone.utc)
+        article_url = "https://www.kucoin.com/announcement" + article.get("path", "")
+        return article.get("title"), article.get("summary"), msg_datetime, int(article["id"]), article_url
 
 
-class BinanceScraperWeb(BinanceScraper):
+class BinanceScraperWeb(ApiScraper, BinanceScraper):
     def __init__(self):
         super().__init__()
 
     exchange = "binance_web"
     url = "https://www.binance.com/en/support/announcement/delisting?c=161"
-
-    initialScrollUpTimes = 0
-    initialWaitSeconds = 10
-
-    message_bubble = "css-1tl1y3y"
-    message_text = ["css-1yxx6id"]
-    message_date = {"type": "p",
-                    "class": "css-eoufru",
-                    "format": ""}
-
-    def extract_datetime(self, message_html):
-        if self.message_date['format'] == "":
-            return datetime(1970, 1, 1)  # Return a default datetime object
-        datetime_html = message_html.find(self.message_date['type'], class_=self.message_date['class'])
-        msg_datetime = datetime.strptime(datetime_html.contents[0], self.message_date['format'])
-        return msg_datetime
-
-
-def save_blacklist(exchange: str, new_blacklisted_pairs: []):
-    for bot_group in StatVars.bot_groups:
-        if exchange in bot_group['exchanges']:
-            file_name = bot_group['config_path']
-            if os.path.exists(file_name):
-                # Read existing data from file
+    api_url = "https://www.binance.com/bapi/composite/v1/public/cms/article/list/query"
+    # catalog 161 is "Delisting"
+    api_params = {"type": 1, "catalogId": 161, "pageNo": 1, "pageSize": 20}
+
+    def get_articles(self, data):
+        catalogs = (data.get("data") or {}).get("catalogs") or []
+        return [article for catalog in catalogs for article in catalog.get("articles") or []]
+
+    # releaseDate is in unix milliseconds
+    def get_article(self, article):
+        msg_datetime = datetime.fromtimestamp(int(article["releaseDate"]) / 1000, timezone.utc)
+        article_url = f"https://www.binance.com/en/support/announcement/{article.get('code', article['id'])}"
+        return article.get("title"), None, msg_datetime, int(article["id"]), article_url
+
+
+# exchanges that get scraped by the scheduler
+SCRAPERS = {
+    'binance': BinanceScraper,
+    'bybit': BybitScraper,
+    'okx': OkxScraper,
+    'gateio': GateioScraper,
+    # HTX stopped working have to change the URL.
+    # 'htx': HtxScraper,
+    'kucoin': KucoinScraper,
+}
+
+# the website sources, scheduled next to the telegram scraper of their exchange (see StatVars.web_sources)
+WEB_SCRAPERS = {
+    'binance': BinanceScraperWeb,
+    'kucoin': KucoinScraperWeb,
+}
+
+
+class BlacklistWriter:
+    # Keeps the parsed config of every bot config file together with a set of its blacklisted pairs. New pairs are
+    # merged into that, flush() writes every file that got new pairs once, atomically (tmp file + rename),
+    # so bot groups sharing a config file share the write and freqtrade never reads a half-written file.
+    def __init__(self):
+        self.lock = threading.Lock()
+        # file name -> {"data": config, "pairs": set of the blacklist, "mtime": of our last read/write, "dirty": bool}
+        self.files = {}
+
+    def get_file(self, file_name):
+        mtime = os.stat(file_name).st_mtime_ns if os.path.exists(file_name) else None
+        config_file = self.files.get(file_name)
+        # re-read the file if somebody else changed it, unless we still have to write our pairs into it
+        if config_file is None or (config_file["mtime"] != mtime and not config_file["dirty"]):
+            if mtime is not None:
                 with open(file_name, 'r') as json_file:
                     data = rapidjson.load(json_file, parse_mode=StatVars.CONFIG_PARSE_MODE)
             else:
@@ -600,27 +2011,66 @@ def save_blacklist(exchange: str, new_blacklisted_pairs: []):
                         "pair_blacklist": []
                     }
                 }
+            config_file = {"data": data, "pairs": set(data["exchange"]["pair_blacklist"]), "mtime": mtime,
+                           "dirty": False}
+            self.files[file_name] = config_file
+        return config_file
+
+    # returns the pairs that were not in the file yet
+    def add(self, file_name, pairs):
+        with self.lock:
+            config_file = self.get_file(file_name)
+            new_pairs = [pair for pair in dict.fromkeys(pairs) if pair not in config_file["pairs"]]
+            if new_pairs:
+                config_file["pairs"].update(new_pairs)
+                config_file["data"]["exchange"]["pair_blacklist"].extend(new_pairs)
+                config_file["dirty"] = True
+            return new_pairs
+
+    # a file that can't be written (permissions, full disk) stays dirty and gets retried with the next flush
+    def flush(self):
+        with self.lock:
+            for file_name, config_file in self.files.items():
+                if not config_file["dirty"]:
+                    continue
+                try:
+                    tmp_file_name = f"{file_name}.tmp"
+                    with open(tmp_file_name, 'w') as json_file:
+                        rapidjson.dump(config_file["data"], json_file, indent=4)
+                        json_file.flush()
+                        os.fsync(json_file.fileno())
+                    os.replace(tmp_file_name, file_name)
+                    config_file["mtime"] = os.stat(file_name).st_mtime_ns
+                    config_file["dirty"] = False
+                    logging.info(f"saved the blacklist of {file_name}")
+                except Exception as ex:
+                    logging.error(f"could not save the blacklist of {file_name}, retrying with the next flush: {ex}")
 
-            # Add new blacklisted pairs if they are not already present
-            for pair in new_blacklisted_pairs:
-                if pair not in data["exchange"]["pair_blacklist"]:
-                    data["exchange"]["pair_blacklist"].append(pair)
-                    bot_group['new_pair_blacklist'].append(pair)
 
-            # Save modified data back to the file
-            with open(file_name, 'w') as json_file:
-                rapidjson.dump(data, json_file, indent=4)
+StatVars.blacklist_writer = BlacklistWriter()
+
+
+# the pairs get written with the next StatVars.blacklist_writer.flush(), process_new_messages flushes right away
+def save_blacklist(exchange: str, new_blacklisted_pairs: []):
+    new_pairs_per_file = {}
+    for bot_group in StatVars.bot_groups:
+        if exchange in bot_group['exchanges']:
+            file_name = bot_group['config_path']
+            # every bot group of a shared file gets told about the pairs that are new to that file
+            if file_name not in new_pairs_per_file:
+                new_pairs_per_file[file_name] = StatVars.blacklist_writer.add(file_name, new_blacklisted_pairs)
+            bot_group['new_pair_blacklist'].extend(new_pairs_per_file[file_name])
 
 
 def open_processed():
-    StatVars.logger.info("Loading local processed file")
+    StatVars.logger.info("Loading local processed store")
+    StatVars.processed_store = ProcessedStore(StatVars.path_processed_db)
+    if StatVars.processed_store.count() > 0:
+        return
+    # first start with the store: take over the history of processed.json
     try:
-        set_unique_identifiers()
-        # Read config from stdin if requested in the options
-        with Path(StatVars.path_processed_file).open() if StatVars.path_processed_file != '-' else sys.stdin as file:
-            StatVars.has_been_processed = rapidjson.load(file, parse_mode=StatVars.CONFIG_PARSE_MODE)
-        StatVars.unique_identifiers = set(
-            (entry["exchange"], entry["date"]) for entry in StatVars.has_been_processed)
+        imported = StatVars.processed_store.import_json(StatVars.path_processed_file)
+        StatVars.logger.info(f"Imported {imported} messages from {StatVars.path_processed_file}")
     except FileNotFoundError:
         logging.error(f'Config file "{StatVars.path_processed_file}" not found!'
                       ' Please create a config file or check whether it exists.')
@@ -628,19 +2078,22 @@ def open_processed():
         logging.error('Please verify your configuration file for syntax errors.')
 
 
-def save_processed():
-    StatVars.logger.info("Saving local processed file")
+def save_processed(message_dicts):
+    StatVars.logger.info("Saving local processed store")
     try:
-        set_unique_identifiers()
-        sorted_json_obj = rapidjson.dumps(
-            sorted(StatVars.has_been_processed, key=lambda x: (x['exchange'], x['date'])), indent=4)
-        with open(StatVars.path_processed_file, "w") as outfile:
-            outfile.write(sorted_json_obj)
-
+        StatVars.processed_store.add(message_dicts)
+        if StatVars.export_processed_on_save:
+            export_processed()
     except Exception as e:
         logging.info(e)
 
 
+def export_processed(path=None):
+    path = path or StatVars.path_processed_file
+    StatVars.logger.info(f"Exporting the processed store to {path}")
+    StatVars.processed_store.export_json(path)
+
+
 def load_blacklist(config_file):
     StatVars.logger.info("opening local blacklist files")
     try:
@@ -672,85 +2125,140 @@ def add_backtest_json_file_info(bot_group):
     return bot_group
 
 
-# Sends blacklisted pairs if they are not yet in the bots config file
-def send_blacklists():
-    for bot_group in StatVars.bot_groups:
-        if 'new_pair_blacklist' in bot_group:
-            for ip in bot_group['ips']:
-                try:
-                    api_bot = (
-                        freqtrade_client.FtRestClient(
-                            f"http://{ip}", bot_group['username'], bot_group['password']))
-                    api_bot_status = api_bot.status()
-                    if isinstance(api_bot_status, list):
-                        blacklist_response = api_bot.blacklist()
-                        if blacklist_response is None:
-                            logging.warning(f"bot http://{ip} did not respond while trying to send the blacklist! "
-                                            f"Skipping")
-                            continue
-                        for pair in bot_group['new_pair_blacklist']:
-                            if pair in blacklist_response['blacklist']:
-                                logging.info(f"bot http://{ip}: Skipped sending the blacklist pair  {pair} "
-                                             f"Reason: pair exists already")
-                            else:
-                                result = api_bot.blacklist(pair)
-                                if 'error' in result:
-                                    logging.error(f"bot http://{ip}: Attempted to send a blacklist pair and failed "
-                                                  f"Error: {result['result']}")
-                                else:
-                                    logging.info(f"bot http://{ip}: Successfully sent the pair {pair} to the blacklist")
-                    else:
-                        logging.warning(f"bot http://{ip}: connection failed. Skipping to send send_blacklists!")
+def get_bot_client(bot_group, ip):
+    # one client (and with it one pooled http session) per bot for the whole runtime
+    key = (ip, bot_group['username'])
+    api_bot = StatVars.bot_clients.get(key)
+    if api_bot is None:
+        api_bot = freqtrade_client.FtRestClient(
+            f"http://{ip}", bot_group['username'], bot_group['password'], timeout=StatVars.bot_timeout)
+        StatVars.bot_clients[key] = api_bot
+    return api_bot
 
-                except Exception as ex:
-                    logging.error(f"An error occurred: {ex}")
 
+# A call that raises (FtRestClient only catches ConnectionError, a requests.ReadTimeout gets through) returns None
+# like a call the bot didn't answer: the caller releases its claim and goes on with the next action.
+# failed calls per bot and kind of call (status, get blacklist, blacklist, forceexit, forceenter)
+def count_bot_call_error(ip, action):
+    StatVars.metrics.inc("delist_bot_call_errors_total", bot=ip,
+                         action=action.split(" ")[0] if "/" in action else action)
 
-def send_force_enter_short():
-    for bot_group in StatVars.bot_groups:
-        if bot_group['force_enter_short']:
-            if 'new_pair_blacklist' in bot_group:
-                for ip in bot_group['ips']:
-                    api_bot = (
-                        freqtrade_client.FtRestClient(
-                            f"http://{ip}", bot_group['username'], bot_group['password']))
-                    api_bot_status = api_bot.status()
-                    if isinstance(api_bot_status, list):
-                        for pair in bot_group['new_pair_blacklist']:
-                            result = api_bot.forceenter(pair, 'short')
-                            if 'error' in result:
-                                logging.error(f"bot http://{ip}: Attempted to force enter a short trade of {pair}"
-                                              f" and failed. Error: {result['result']}")
-                            else:
-                                logging.info(f"bot http://{ip}: Successfully sent a force enter short order "
-                                             f"of the pair {pair}")
-                    else:
-                        logging.warning(f"bot http://{ip}: connection failed. Skipping to send send_force_enter_short!")
-
-
-def send_force_exit_long():
+
+def timed_call(ip, action, latencies, function, *args):
+    start_time = time.monotonic()
+    try:
+        result = function(*args)
+    except Exception as ex:
+        logging.error(f"bot http://{ip}: {action} failed: {ex}")
+        count_bot_call_error(ip, action)
+        result = None
+    latencies[action] = round(time.monotonic() - start_time, 3)
+    logging.info(f"bot http://{ip}: {action} took {latencies[action]}s")
+    return result
+
+
+# Sends the new pairs of the bot group to one bot, in this order:
+# force exit of open longs, one batched blacklist call, force enter shorts.
+# Returns the latency of each action in seconds.
+def notify_bot(bot_group, ip, force_orders, timeline=None, announcements=None):
+    latencies = {}
+    announcements = announcements or {}
+    api_bot = get_bot_client(bot_group, ip)
+    new_pairs = bot_group['new_pair_blacklist']
+
+    open_trades = timed_call(ip, "status", latencies, api_bot.status)
+    if not isinstance(open_trades, list):
+        logging.warning(f"bot http://{ip}: connection failed. Skipping to notify this bot!")
+        return latencies
+
+    # exits first, those are the ones that lose money while we wait
+    if force_orders and bot_group['force_exit_long']:
+        for open_trade in open_trades:
+            if open_trade['pair'] in new_pairs and not open_trade['is_short']:  # only exit long, not short
+                action = f"forceexit {open_trade['pair']}"
+                if not claim_action(announcements.get(open_trade['pair']), ip, action,
+                                    StatVars.force_order_window_secs):
+                    continue
+                result = timed_call(ip, action, latencies, api_bot.forceexit, open_trade['trade_id'])
+                if not result or 'error' in result:
+                    release_action(announcements.get(open_trade['pair']), ip, action)
+                    count_bot_call_error(ip, action)
+                    logging.error(f"bot http://{ip}: Attempted to force exit a long trade "
+                                  f"of {open_trade['pair']} and failed. Error: {result}")
+                else:
+                    record_bot_ack(timeline, ip, "forceexit")
+                    logging.info(f"bot http://{ip}: Successfully sent a force-exit-long order "
+                                 f"of the pair {open_trade['pair']}")
+
+    blacklist_response = timed_call(ip, "get blacklist", latencies, api_bot.blacklist)
+    if not isinstance(blacklist_response, dict) or 'blacklist' not in blacklist_response:
+        # no answer or an error body like {"detail": ...}, the force enters below are still sent
+        if blacklist_response is not None:
+            count_bot_call_error(ip, "get blacklist")
+        logging.error(f"bot http://{ip}: Attempted to get the blacklist and failed, skipping to send it. "
+                      f"Error: {blacklist_response}")
+    else:
+        existing_pairs = set(blacklist_response['blacklist'])
+        missing_pairs = [pair for pair in new_pairs if pair not in existing_pairs]
+        if len(missing_pairs) < len(new_pairs):
+            logging.info(f"bot http://{ip}: Skipped sending the blacklist pairs "
+                         f"{[pair for pair in new_pairs if pair not in missing_pairs]} Reason: pairs exist already")
+        missing_pairs = [pair for pair in missing_pairs
+                         if claim_action(announcements.get(pair), ip, f"blacklist {pair}")]
+        if missing_pairs:
+            result = timed_call(ip, "blacklist", latencies, api_bot.blacklist, *missing_pairs)
+            if not result or 'error' in result:
+                for pair in missing_pairs:
+                    release_action(announcements.get(pair), ip, f"blacklist {pair}")
+                count_bot_call_error(ip, "blacklist")
+                logging.error(f"bot http://{ip}: Attempted to send the blacklist pairs and failed "
+                              f"Error: {result}")
+            else:
+                for pair, error in result.get('errors', {}).items():
+                    logging.error(f"bot http://{ip}: Attempted to send the blacklist pair {pair} and failed "
+                                  f"Error: {error}")
+                record_bot_ack(timeline, ip, "blacklist")
+                logging.info(f"bot http://{ip}: Successfully sent the pairs {missing_pairs} to the blacklist")
+
+    if force_orders and bot_group['force_enter_short']:
+        for pair in new_pairs:
+            # a second forceenter would open a second trade, so this one is the reason for the ledger. Keyed on the
+            # bot and pair, another source's copy of the announcement must not open it again
+            if not claim_action(announcements.get(pair), ip, f"forceenter {pair}", StatVars.force_order_window_secs):
+                continue
+            result = timed_call(ip, f"forceenter {pair}", latencies, api_bot.forceenter, pair, 'short')
+            if not result or 'error' in result:
+                release_action(announcements.get(pair), ip, f"forceenter {pair}")
+                count_bot_call_error(ip, f"forceenter {pair}")
+                logging.error(f"bot http://{ip}: Attempted to force enter a short trade of {pair}"
+                              f" and failed. Error: {result}")
+            else:
+                record_bot_ack(timeline, ip, "forceenter")
+                logging.info(f"bot http://{ip}: Successfully sent a force enter short order "
+                             f"of the pair {pair}")
+    return latencies
+
+
+# Notifies all bots in parallel about the pairs that are new in their bot group's blacklist.
+# force_orders: also force exit longs and force enter shorts (only on fresh news)
+# timeline: exchange and times of the newest announcement, for the latency metrics
+# announcements: pair -> key of the announcement that delisted it, for the idempotency ledger (see Coordinator)
+def notify_bots(force_orders, timeline=None, announcements=None):
+    futures = {}
     for bot_group in StatVars.bot_groups:
-        if bot_group['force_exit_long']:
-            if 'new_pair_blacklist' in bot_group:
-                for ip in bot_group['ips']:
-                    api_bot = (
-                        freqtrade_client.FtRestClient(
-                            f"http://{ip}", bot_group['username'], bot_group['password']))
-                    open_trades = api_bot.status()
-                    if isinstance(open_trades, list):
-                        for pair in bot_group['new_pair_blacklist']:
-                            for open_trade in open_trades:
-                                if pair == open_trade['pair']:
-                                    if not open_trade['is_short']:  # only exit long, not short
-                                        result = api_bot.forceexit(open_trade['trade_id'])
-                                        if 'error' in result:
-                                            logging.error(f"bot http://{ip}: Attempted to force exit a long trade "
-                                                          f"of {pair} and failed. Error: {result['result']}")
-                                        else:
-                                            logging.info(f"bot http://{ip}: Successfully sent a force-exit-long order "
-                                                         f"of the pair {pair}")
-                    else:
-                        logging.warning(f"bot http://{ip}: connection failed. Skipping to send_force_exit_long!")
+        if not bot_group.get('new_pair_blacklist'):
+            continue
+        for ip in bot_group['ips']:
+            futures[StatVars.notify_executor.submit(notify_bot, bot_group, ip, force_orders, timeline,
+                                                    announcements)] = ip
+
+    for future in concurrent.futures.as_completed(futures):
+        ip = futures[future]
+        try:
+            latencies = future.result()
+            logging.info(f"bot http://{ip}: notified in {round(sum(latencies.values()), 3)}s {latencies}")
+        except Exception as ex:
+            logging.error(f"bot http://{ip}: An error occurred: {ex}")
 
 
 # This checks all bots' connections ... just for the user as a sanity check
@@ -758,9 +2266,7 @@ def check_all_bots():
     logging.info("checking all bot-connections:")
     for bot_group in StatVars.bot_groups:
         for ip in bot_group['ips']:
-            api_bot = (freqtrade_client.FtRestClient(
-                f"http://{ip}", bot_group['username'], bot_group['password']))
-            response = api_bot.status()
+            response = get_bot_client(bot_group, ip).status()
             if isinstance(response, list):
                 logging.info(f"bot http://{ip}: connection successful!")
             else:
@@ -788,28 +2294,319 @@ def refresh_ccxt_exchange_pairs(exchanges_pairs):
         futures = {executor.submit(get_exchange_pairs, exchange): exchange for exchange in exchanges_pairs.keys()}
         for future in concurrent.futures.as_completed(futures):
             exchange = futures[future]
-            exchanges_pairs[exchange] = future.result()
+            exchanges_pairs[exchange] = compact_markets(future.result())
+            save_markets_snapshot(exchange, exchanges_pairs[exchange])
+            # build the lookup tables now instead of on the first news
+            if exchange in SCRAPERS:
+                scraper_class = SCRAPERS[exchange]
+                get_symbol_index(exchange, exchanges_pairs[exchange],
+                                 scraper_class.coin_prefixes, scraper_class.coin_suffixes)
 
 
-def handle_exception(ex1):
-    try:
-        StatVars.driver.quit()
-    except Exception as ex3:
-        logging.error(f"an error occurred: {ex3}")
-    try:
-        StatVars.driver = set_driver()
-    except Exception as ex2:
-        logging.error(f"an error occurred: {ex2}")
+# Refreshes the markets every markets_refresh_secs in the background, the scrapers keep using the snapshot meanwhile
+def refresh_markets_forever(exchanges_pairs):
+    while True:
+        # Only rescan if the minute is not modulo 5 == 0
+        # This is done to avoid any potential conflicts with query weights for any timeframe >=5m
+        while datetime.now().minute % 5 == 0:
+            time.sleep(5)
+        try:
+            refresh_ccxt_exchange_pairs(exchanges_pairs)
+        except Exception as ex:
+            logging.error(f"An error occurred while refreshing the markets: {ex}")
+        time.sleep(StatVars.markets_refresh_secs)
+
+
+def start_markets_refresher(exchanges_pairs):
+    thread = threading.Thread(target=refresh_markets_forever, args=(exchanges_pairs,), name="markets-refresher",
+                              daemon=True)
+    thread.start()
+    return thread
+
+
+class Coordinator:
+    # Shared sqlite file of all scraper instances (StatVars.coordination_db). An exchange is leased to one node
+    # at a time, the lease is renewed by every scrape and taken over by another node once it expired.
+    # The ledger holds every (announcement, bot, action) that was executed, so it happens once across all nodes.
+    # No WAL here, it doesn't work on network file systems. The lease times need roughly synchronized clocks.
+    def __init__(self, path, node_id, lease_secs):
+        self.node_id = node_id
+        self.lease_secs = lease_secs
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS leases "
+                                    "(exchange TEXT PRIMARY KEY, node TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS ledger (announcement TEXT NOT NULL, bot TEXT NOT NULL, "
+                                    "action TEXT NOT NULL, node TEXT, created_at REAL, "
+                                    "PRIMARY KEY (announcement, bot, action))")
+
+    # takes or renews the lease, returns whether this node holds it
+    def acquire_lease(self, exchange):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.execute(
+                    "INSERT INTO leases (exchange, node, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (exchange) DO UPDATE SET node = excluded.node, expires_at = excluded.expires_at "
+                    "WHERE leases.node = excluded.node OR leases.expires_at < ?",
+                    (exchange, self.node_id, now + self.lease_secs, now))
+                node = self.connection.execute("SELECT node FROM leases WHERE exchange = ?", (exchange,)).fetchone()[0]
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return node == self.node_id
+
+    def release_leases(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM leases WHERE node = ?", (self.node_id,))
+
+    # returns False if this action was executed (or is being executed) by any node already, for this announcement
+    # or, with window_secs, for any announcement within the last window_secs
+    def claim(self, announcement, bot, action, window_secs=None):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                if window_secs is not None and self.connection.execute(
+                        "SELECT 1 FROM ledger WHERE bot = ? AND action = ? AND created_at >= ?",
+                        (bot, action, now - window_secs)).fetchone() is not None:
+                    claimed = False
+                else:
+                    claimed = self.connection.execute(
+                        "INSERT OR IGNORE INTO ledger (announcement, bot, action, node, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (announcement, bot, action, self.node_id, now)).rowcount == 1
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return claimed
+
+    # the action failed, let the next try (of any node) do it again
+    def release(self, announcement, bot, action):
+        with self.lock:
+            self.connection.execute("DELETE FROM ledger WHERE announcement = ? AND bot = ? AND action = ?",
+                                    (announcement, bot, action))
+
+    def prune(self, keep_days):
+        with self.lock:
+            self.connection.execute("DELETE FROM ledger WHERE created_at < ?", (time.time() - keep_days * 86400,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def open_coordinator():
+    if StatVars.coordination_db is None:
+        return
+    StatVars.coordinator = Coordinator(StatVars.coordination_db, StatVars.node_id, StatVars.lease_secs)
+    StatVars.coordinator.prune(StatVars.ledger_keep_days)
+    logging.info(f"coordinating as {StatVars.node_id} through {StatVars.coordination_db}")
+
+
+def close_coordinator():
+    if StatVars.coordinator is not None:
+        StatVars.coordinator.release_leases()
+        StatVars.coordinator.close()
+        StatVars.coordinator = None
+
+
+# without coordination every exchange belongs to this instance
+def holds_lease(exchange):
+    return StatVars.coordinator is None or StatVars.coordinator.acquire_lease(exchange)
+
+
+# without coordination (or without a known announcement) every action gets executed
+def claim_action(announcement, bot, action, window_secs=None):
+    if StatVars.coordinator is None or announcement is None:
+        return True
+    if StatVars.coordinator.claim(announcement, bot, action, window_secs):
+        return True
+    logging.info(f"bot http://{bot}: {action} for {announcement} was executed by another node already, skipping")
+    return False
+
+
+def release_action(announcement, bot, action):
+    if StatVars.coordinator is not None and announcement is not None:
+        StatVars.coordinator.release(announcement, bot, action)
+
+
+class ScrapeJob:
+    # one exchange with its own fetch backend, so a slow or broken channel can't stall the others
+    def __init__(self, exchange, scraper_class):
+        self.exchange = exchange
+        self.markets_exchange = get_markets_exchange(exchange)
+        self.scraper_class = scraper_class
+        self.driver = None
+        self.next_run = 0.0
+        self.failures = 0
+        # posting rate and hot hours of the channel, see refresh_activity
+        self.posts_per_day = None
+        self.hot_hours = set()
+        self.activity_time = None
+
+    def run(self, exchanges_pairs):
+        start_time = time.monotonic()
+        self.next_run = start_time + self.get_loop_secs()
+        try:
+            if not holds_lease(self.exchange):
+                # another node scrapes this exchange, check again next time in case its lease expires
+                logging.debug(f"{self.exchange}: leased to another node")
+                return
+            pairs = exchanges_pairs[self.markets_exchange]
+            with record_stages(self.exchange), StatVars.profiler.profile_loop():
+                if not self.scraper_class.needs_page_fetcher:
+                    self.scraper_class().scrape(pairs)
+                elif StatVars.fetch_mode == 'browser':
+                    # browsers are expensive, they are leased from the shared pool for every run
+                    with StatVars.driver_pool.lease() as driver:
+                        self.scraper_class().scrape(pairs, driver)
+                else:
+                    if self.driver is None:
+                        self.driver = get_page_fetcher()
+                    self.scraper_class().scrape(pairs, self.driver)
+            self.failures = 0
+            StatVars.metrics.inc("delist_scrape_loops_total", exchange=self.exchange, result="ok")
+        except Exception as ex1:
+            StatVars.metrics.inc("delist_scrape_loops_total", exchange=self.exchange, result="error")
+            handle_exception(ex1, self)
+        StatVars.metrics.observe("delist_scrape_loop_seconds", time.monotonic() - start_time, exchange=self.exchange)
+
+    def get_loop_secs(self):
+        self.refresh_activity()
+        loop_secs = StatVars.exchange_loop_secs.get(self.exchange, StatVars.loop_secs)
+        if datetime.now(timezone.utc).hour in self.hot_hours:
+            return max(StatVars.min_loop_secs, loop_secs * StatVars.hot_window_factor)
+        if self.posts_per_day is not None and self.posts_per_day < StatVars.quiet_posts_per_day:
+            quiet_factor = min(StatVars.quiet_max_factor,
+                               StatVars.quiet_posts_per_day / max(self.posts_per_day, 0.1))
+            loop_secs = min(max(loop_secs, StatVars.max_loop_secs), loop_secs * quiet_factor)
+        return loop_secs
+
+    def refresh_activity(self):
+        now = time.monotonic()
+        if self.activity_time is not None and now - self.activity_time < StatVars.activity_refresh_secs:
+            return
+        self.activity_time = now
+        # posts per day over the last 7 days, or as far as the store reaches back
+        oldest_date = StatVars.processed_store.get_oldest_date(self.exchange)
+        history_secs = (datetime.now(timezone.utc) - parse_date(oldest_date)).total_seconds() if oldest_date else 0
+        if history_secs < StatVars.quiet_min_history_secs:
+            self.posts_per_day = None
+        else:
+            days = min(7.0, history_secs / 86400)
+            since = (datetime.now(timezone.utc) - timedelta(days=days)).strftime(StatVars.datetimeFormat)
+            self.posts_per_day = StatVars.processed_store.count_since(self.exchange, since) / days
+        hot_windows = StatVars.hot_windows_utc.get(self.exchange)
+        if hot_windows is not None:
+            self.hot_hours = {hour % 24 for start, end in hot_windows for hour in range(start, end + (end < start) * 24)}
+        else:
+            delisting_hours = StatVars.processed_store.get_delisting_hours(self.exchange)
+            delistings = sum(delisting_hours.values())
+            self.hot_hours = {hour for hour, count in delisting_hours.items()
+                              if delistings >= 20 and count / delistings >= StatVars.hot_hour_share}
+        posts_per_day = "unknown" if self.posts_per_day is None else f"{self.posts_per_day:.1f}"
+        logging.debug(f"{self.exchange}: {posts_per_day} posts per day, hot hours (UTC): {sorted(self.hot_hours)}")
+
+    # jittered exponential backoff for a failing exchange
+    def get_backoff_secs(self):
+        backoff_secs = min(StatVars.error_sleep_max_secs, StatVars.error_sleep_secs * 2 ** (self.failures - 1))
+        return backoff_secs * random.uniform(1 - StatVars.backoff_jitter, 1 + StatVars.backoff_jitter)
+
+    def restart_driver(self):
+        try:
+            if self.driver is not None:
+                self.driver.quit()
+        except Exception as ex3:
+            logging.error(f"{self.exchange}: an error occurred: {ex3}")
+        # gets recreated on the next run
+        self.driver = None
+
+    def quit(self):
+        self.restart_driver()
+
+
+class ScrapeScheduler:
+    def __init__(self, exchanges):
+        self.jobs = [ScrapeJob(exchange, scraper_class) for exchange, scraper_class in SCRAPERS.items()
+                     if exchange in exchanges]
+        self.jobs += [ScrapeJob(scraper_class.exchange, scraper_class)
+                      for exchange, scraper_class in WEB_SCRAPERS.items()
+                      if exchange in exchanges and exchange in StatVars.web_sources]
+        self.executor = ThreadPoolExecutor(max_workers=StatVars.max_concurrent_scrapers,
+                                           thread_name_prefix="scraper")
+        self.running = {}
+
+    # starts every job that is due and not running anymore, returns the count of jobs that finished since last time
+    def run_pending(self, exchanges_pairs):
+        finished = [job for job, future in self.running.items() if future.done()]
+        for job in finished:
+            del self.running[job]
+
+        now = time.monotonic()
+        for job in self.jobs:
+            # without markets we can't tell which pairs a message is about, wait for the first refresh
+            if not exchanges_pairs.get(job.markets_exchange):
+                continue
+            if job not in self.running and job.next_run <= now:
+                self.running[job] = self.executor.submit(job.run, exchanges_pairs)
+        return len(finished)
+
+    def seconds_until_next_run(self):
+        idle_jobs = [job.next_run for job in self.jobs if job not in self.running]
+        if not idle_jobs:
+            return 1.0
+        # still look at the running jobs every second
+        return min(max(min(idle_jobs) - time.monotonic(), 0.1), 1.0)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        for job in self.jobs:
+            job.quit()
+
+
+def handle_exception(ex1, job=None):
+    if job is not None:
+        # only the failing exchange takes a nap, it could be anything ... even being rate limited
+        job.failures += 1
+        backoff_secs = job.get_backoff_secs()
+        logging.error(f"{job.exchange}: An error occurred: {ex1}, failure {job.failures} in a row, "
+                      f"retrying in {backoff_secs:.0f} seconds")
+        job.restart_driver()
+        job.next_run = time.monotonic() + backoff_secs
+        return
     logging.error(f"An error occurred: {ex1}")
-    time.sleep(30)  # an error happened, could be anything ... even being rate limited ... Take a nap bot!
+    time.sleep(StatVars.error_sleep_secs)  # an error happened, could be anything ... Take a nap bot!
+
+
+def backfill(exchanges):
+    open_processed()
+    load_bots_data()
+    exchanges = [exchange for exchange in (exchanges or get_exchanges_from_bot_groups()) if exchange in SCRAPERS]
+    exchanges_pairs = {exchange: load_markets_snapshot(exchange) for exchange in exchanges}
+    missing_pairs = {exchange: {} for exchange, pairs in exchanges_pairs.items() if not pairs}
+    if missing_pairs:
+        refresh_ccxt_exchange_pairs(missing_pairs)
+        exchanges_pairs.update(missing_pairs)
+    for exchange in exchanges:
+        driver = get_page_fetcher()
+        try:
+            SCRAPERS[exchange]().backfill(exchanges_pairs[exchange], driver)
+        finally:
+            driver.quit()
+            StatVars.blacklist_writer.flush()
 
 
 def main():
-    StatVars.driver = set_driver()
     # make the script not gobble up resources
     os.nice(15)
     open_processed()
     load_bots_data()
+    open_coordinator()
+    install_profile_signal()
 
     exchanges_to_loop_through = get_exchanges_from_bot_groups()
     check_all_bots()
@@ -817,109 +2614,74 @@ def main():
     # StatVars.bot_groups[0]['new_pair_blacklist'].append("BTC/USDT:USDT")
     # StatVars.bot_groups[0]['new_pair_blacklist'].append("ETH/USDT:USDT")
     # StatVars.bot_groups[0]['new_pair_blacklist'].append("SOL/USDT:USDT")
-    # send_force_exit_long()
-    # send_force_enter_short()
-    # send_blacklists()
-
-    heartbeat_time_pairs = datetime.min
-    heartbeat_time = datetime.min  # will push a heartbeat out instantly
-    exchanges = ['binance', 'kucoin', 'bybit', 'okx', 'gateio', 'htx']
-    exchanges_pairs = {exchange: {} for exchange in exchanges}  # Initialize as empty dictionaries
+    # notify_bots(force_orders=True)
 
-    while True:
-        try:
-            StatVars.blacklist_changed = False
-
-            # Only rescan if the minute is not modulo 5 == 0
-            # This is done to avoid any potential conflicts with query weights for any timeframe >=5m
-            if datetime.now() - heartbeat_time_pairs >= timedelta(hours=24) and datetime.now().minute % 5 > 0:
-                refresh_ccxt_exchange_pairs(exchanges_pairs)
-                heartbeat_time_pairs = datetime.now()
-
-            # Even if the previous condition triggered, still run through it on startup
-            elif all(not exchange_pairs for exchange_pairs in exchanges_pairs.values()):
-                logging.info(f"waiting 1 minute, start time is at {datetime.now().minute} % 5 == 0 "
-                             f"(to avoid potential issues with query weights)")
-                time.sleep(60)
-                refresh_ccxt_exchange_pairs(exchanges_pairs)
-                heartbeat_time_pairs = datetime.now()
-                StatVars.driver.quit()
-                StatVars.driver = set_driver()
-
-            start_time = time.monotonic()
-        except Exception as ex1:
-            handle_exception(ex1)
-
-        try:
-            current_exchange = "binance"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = BinanceScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-        except Exception as ex1:
-            handle_exception(ex1)
-
-        try:
-            current_exchange = "bybit"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = BybitScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-        except Exception as ex1:
-            handle_exception(ex1)
+    if StatVars.http_port is not None:
+        start_http_server()
 
-        try:
-            current_exchange = "okx"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = OkxScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-        except Exception as ex1:
-            handle_exception(ex1)
-
-        try:
-            current_exchange = "gateio"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = GateioScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-        except Exception as ex1:
-            handle_exception(ex1)
-
-        # HTX stopped working have to change the URL.
-        '''
-        try:
-            current_exchange = "htx"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = HtxScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-                del current_instance
-        except Exception as ex1:
-            handle_exception(ex1)
-        '''
-        try:
-            current_exchange = "kucoin"
-            if current_exchange.lower() in exchanges_to_loop_through:
-                current_instance = KucoinScraper()
-                current_instance.scrape(exchanges_pairs[current_exchange])
-        except Exception as ex1:
-            handle_exception(ex1)
+    heartbeat_time = datetime.min  # will push a heartbeat out instantly
+    metrics_file_time = time.monotonic()
+    # start from the snapshots right away, the fresh markets arrive in the background
+    exchanges_pairs = {exchange: load_markets_snapshot(exchange) or {} for exchange in exchanges_to_loop_through}
+    StatVars.exchanges_pairs = exchanges_pairs
+    start_markets_refresher(exchanges_pairs)
 
-        try:
-            if datetime.now() - heartbeat_time >= timedelta(minutes=15):
-                # Execute heartbeat action
-                logging.info("delist-scraper heartbeat")
+    scheduler = ScrapeScheduler(exchanges_to_loop_through)
+    try:
+        while True:
+            try:
+                if datetime.now() - heartbeat_time >= timedelta(minutes=15):
+                    # Execute heartbeat action
+                    logging.info("delist-scraper heartbeat")
+
+                    # Update heartbeat time
+                    heartbeat_time = datetime.now()
+
+            except Exception as ex1:
+                handle_exception(ex1)
+
+            # neither the profiling nor the metrics may ever stop the scraping, e.g. on a full disk
+            try:
+                check_profile_request()
+            except Exception as ex1:
+                logging.error(f"could not check for a profile request: {ex1}")
+            if StatVars.metrics_file and time.monotonic() - metrics_file_time >= StatVars.metrics_file_secs:
+                metrics_file_time = time.monotonic()
+                try:
+                    StatVars.metrics.write_file(StatVars.metrics_file)
+                except Exception as ex1:
+                    logging.error(f"could not write the metrics to {StatVars.metrics_file}: {ex1}")
 
-                # Update heartbeat time
-                heartbeat_time = datetime.now()
+            if scheduler.run_pending(exchanges_pairs) > 0:
+                gc.collect()
+            # retries the config files that couldn't be written so far
+            StatVars.blacklist_writer.flush()
 
-            # duration_rounded = round((time.monotonic() - loop_start_time), 2)
-            # logging.info(f"This loop took {duration_rounded} seconds")
-            time_to_sleep_left = StatVars.loop_secs - ((time.monotonic() - start_time) % StatVars.loop_secs)
+            time_to_sleep_left = scheduler.seconds_until_next_run()
             logging.debug(f"for this loop we still have to wait for {time_to_sleep_left} seconds")
-
-            time.sleep(StatVars.loop_secs - ((time.monotonic() - start_time) % StatVars.loop_secs))
-            # logging.info("looped once successfully")
-        except Exception as ex1:
-            handle_exception(ex1)
-        gc.collect()
+            time.sleep(time_to_sleep_left)
+    finally:
+        scheduler.shutdown()
+        StatVars.blacklist_writer.flush()
+        StatVars.driver_pool.close()
+        close_coordinator()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrapes exchange news for delisted pairs and blacklists them "
+                                                 "in your freqtrade bots")
+    parser.add_argument("--export-processed", metavar="PATH", nargs="?", const=StatVars.path_processed_file,
+                        help="export the processed store to the legacy processed.json format and exit "
+                             f"(default path: {StatVars.path_processed_file})")
+    parser.add_argument("--backfill", metavar="EXCHANGE", nargs="*",
+                        help="scrape the whole history of the given exchanges (default: all exchanges of your bot "
+                             "groups) in memory-bounded batches and exit, resumes where a previous backfill stopped")
+    args = parser.parse_args()
+
+    if args.backfill is not None:
+        backfill(args.backfill)
+    elif args.export_processed:
+        open_processed()
+        export_processed(args.export_processed)
+    else:
+        main()
@@ -1,12 +1,103 @@
+import json
+import os
 import re
+import sqlite3
 
+import numpy
 import pandas
+from freqtrade.enums import RunMode
 from freqtrade.strategy.interface import IStrategy
 from pandas import DataFrame, Series, DatetimeIndex, merge
 from functools import reduce
 from datetime import timedelta, datetime, timezone
 from typing import Optional, Union, List
-from io import StringIO
+from pathlib import Path
+
+
+def load_pattern_dates(json_df: DataFrame) -> dict:
+    pattern_dates = {}
+    if json_df.empty:
+        return pattern_dates
+    # an announcement counts for the candle that opens after it
+    dates = pandas.to_datetime(json_df['date'], utc=True).dt.ceil('min')
+    for date, blacklisted_pairs in zip(dates.values.astype('datetime64[ns]').view('int64'),
+                                       json_df['blacklisted_pairs']):
+        if isinstance(blacklisted_pairs, list):
+            for pattern in blacklisted_pairs:
+                pattern_dates.setdefault(pattern, []).append(date)
+    return pattern_dates
+
+
+class DelistEventFeed:
+    # The announcements of the scraper as pattern -> timestamps and pair -> timestamps. refresh() only reads what is
+    # new: processed.sqlite (the scraper's store) by row id if it exists, otherwise processed.json once its mtime
+    # changed, skipping the records that were already read (the file is sorted by exchange and date, new records
+    # land anywhere in it). New announcements update the cached pairs in place.
+    def __init__(self, directory: Path):
+        self.sqlite_path = directory / 'processed.sqlite'
+        self.json_path = directory / 'processed.json'
+        self.connection = None
+        self.last_id = 0
+        self.json_mtime = None
+        self.json_keys = set()
+        self.pattern_dates = {}
+        self.pair_dates = {}
+
+    # returns how many announcements were new
+    def refresh(self) -> int:
+        if self.sqlite_path.exists():
+            json_df = self.read_sqlite()
+        elif self.json_path.exists():
+            json_df = self.read_json()
+        else:
+            return 0
+        if json_df.empty:
+            return 0
+        self.add_pattern_dates(load_pattern_dates(json_df))
+        return len(json_df)
+
+    def read_sqlite(self) -> DataFrame:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+        rows = self.connection.execute(
+            "SELECT id, date, blacklisted_pairs FROM processed WHERE id > ? ORDER BY id", (self.last_id,)).fetchall()
+        if rows:
+            self.last_id = rows[-1][0]
+        return DataFrame({'date': [row[1] for row in rows],
+                          'blacklisted_pairs': [json.loads(row[2] or '[]') for row in rows]})
+
+    def read_json(self) -> DataFrame:
+        mtime = os.stat(self.json_path).st_mtime_ns
+        if mtime == self.json_mtime:
+            return DataFrame()
+        self.json_mtime = mtime
+        with open(self.json_path, 'r') as file:
+            records = {json.dumps(record, sort_keys=True): record for record in json.load(file)}
+        if not self.json_keys.issubset(records.keys()):
+            # records were changed or removed (e.g. a replayed store got exported), start over
+            self.json_keys = set()
+            self.pattern_dates = {}
+            self.pair_dates = {}
+        new_records = [record for key, record in records.items() if key not in self.json_keys]
+        self.json_keys.update(records.keys())
+        return DataFrame(new_records, columns=['date', 'blacklisted_pairs']) if new_records else DataFrame()
+
+    def add_pattern_dates(self, new_pattern_dates: dict):
+        for pattern, dates in new_pattern_dates.items():
+            self.pattern_dates.setdefault(pattern, []).extend(dates)
+            for pair, pair_dates in self.pair_dates.items():
+                if re.search(pattern, pair):
+                    self.pair_dates[pair] = numpy.union1d(pair_dates, numpy.array(dates, dtype='int64'))
+
+    def get_pair_dates(self, pair: str) -> numpy.ndarray:
+        dates = self.pair_dates.get(pair)
+        if dates is None:
+            # every pattern is matched once per pair instead of once per candle
+            dates = numpy.unique(numpy.array(
+                [date for pattern, pattern_dates in self.pattern_dates.items() if re.search(pattern, pair)
+                 for date in pattern_dates], dtype='int64'))
+            self.pair_dates[pair] = dates
+        return dates
 
 
 class delist_shorter_strategy(IStrategy):
@@ -24,30 +115,35 @@ class delist_shorter_strategy(IStrategy):
     trailing_stop_positive = 0.10
     process_only_new_candles = True
 
-    # load processed.json into a dataframe once for all pairs
-    with open('./user_data/strategies/processed.json', 'r') as file:
-        json_data = file.read()
-    json_df = pandas.read_json(StringIO(json_data))
-    json_df['date'] = json_df['date'].apply(lambda x: x.ceil('min') if x.second != 0 else x)
+    # load the announcements once for all pairs, live and dry-run bots pick up new ones every loop
+    feed = DelistEventFeed(Path('./user_data/strategies'))
+    feed.refresh()
 
     def leverage(self, pair: str, current_time: datetime, current_rate: float,
                  proposed_leverage: float, max_leverage: float, entry_tag: Optional[str], side: str,
                  **kwargs) -> float:
         return self.my_leverage
 
-    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
-        # Load the JSON file into a DataFrame
-
-        result_df = pandas.merge(dataframe, self.json_df, on='date', how='left')
+    def is_live(self) -> bool:
+        return self.dp is not None and self.dp.runmode in (RunMode.LIVE, RunMode.DRY_RUN)
 
-        result_df['delist_signal'] = False
+    def bot_loop_start(self, current_time: datetime, **kwargs) -> None:
+        if self.is_live():
+            self.feed.refresh()
 
-        for index, row in result_df.iterrows():
-            if isinstance(row['blacklisted_pairs'], list):
-                for pattern in row['blacklisted_pairs']:
-                    if re.search(pattern, metadata['pair']):
-                        result_df.at[index, 'delist_signal'] = True
-        return result_df
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dates = self.feed.get_pair_dates(metadata['pair'])
+        candle_dates = dataframe['date'].values.astype('datetime64[ns]').view('int64')
+        if self.is_live() and self.process_only_new_candles:
+            # only the latest candle can trigger an entry, don't look at the history again
+            dataframe['delist_signal'] = False
+            if len(candle_dates) > 0:
+                position = numpy.searchsorted(dates, candle_dates[-1])
+                dataframe.loc[dataframe.index[-1], 'delist_signal'] = bool(
+                    position < len(dates) and dates[position] == candle_dates[-1])
+        else:
+            dataframe['delist_signal'] = numpy.isin(candle_dates, dates)
+        return dataframe
 
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         dataframe.loc[dataframe['delist_signal'], 'enter_short'] = 1
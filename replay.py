@@ -0,0 +1,185 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import bot
+
+# Offline re-classification of the stored announcements with the current rules and prefix/suffix lists.
+#
+# Streams the messages of processed.sqlite through read_message in a process pool, using the markets snapshots
+# (markets/<exchange>.json.gz) and only the cached announcement pages, so nothing gets fetched. Writes a new store
+# with the new blacklisted_pairs, in the order of the old one (the row ids get renumbered), and a report of the pairs
+# added and removed per message:
+#   python3 replay.py --output processed.replayed.sqlite --report replay_report.json
+# If the report looks right, replace processed.sqlite with the new store (the bot must not run meanwhile, and the
+# strategy reads the store by row id, restart freqtrade afterwards).
+
+CHUNK_SIZE = 500
+
+# every scraper, including the ones that aren't scheduled, so every stored exchange can be replayed
+SCRAPER_CLASSES = {scraper_class.exchange: scraper_class for scraper_class in (
+    bot.BinanceScraper, bot.KucoinScraper, bot.BybitScraper, bot.OkxScraper, bot.GateioScraper, bot.HtxScraper,
+    bot.KucoinScraperWeb, bot.BinanceScraperWeb)}
+
+# markets of the exchanges in this worker process, loaded on first use
+worker_markets = {}
+
+
+def init_worker(page_cache_path, markets_snapshot_dir, log_level):
+    logging.getLogger().setLevel(log_level)
+    bot.StatVars.markets_snapshot_dir = markets_snapshot_dir
+    bot.StatVars.page_cache_only = True
+    bot.StatVars.path_page_cache = page_cache_path
+    # a sqlite connection must not be shared with the parent process
+    bot.StatVars.page_cache = None
+
+
+# the messages of the other exchanges are returned unchanged
+def replay_chunk(exchanges, message_dicts):
+    scrapers = {}
+    replayed = []
+    for message_dict in message_dicts:
+        exchange = message_dict['exchange']
+        if exchange not in exchanges:
+            replayed.append(message_dict)
+            continue
+        if exchange not in scrapers:
+            markets_exchange = bot.get_markets_exchange(exchange)
+            if markets_exchange not in worker_markets:
+                worker_markets[markets_exchange] = bot.load_markets_snapshot(markets_exchange)
+            scrapers[exchange] = SCRAPER_CLASSES[exchange]()
+            scrapers[exchange].pairs = worker_markets[markets_exchange]
+        replayed_dict = dict(message_dict, blacklisted_pairs=[])
+        scrapers[exchange].read_message(replayed_dict)
+        replayed_dict['blacklisted_pairs'] = sorted(set(replayed_dict['blacklisted_pairs']))
+        replayed.append(replayed_dict)
+    return replayed
+
+
+# every message of the store in the order it was stored, the exchanges mixed like they were scraped
+def iter_chunks(store):
+    chunk = []
+    for message_dict in store.iter_messages(by_id=True):
+        chunk.append(message_dict)
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_diff(message_dict, replayed_dict):
+    old_pairs = set(message_dict['blacklisted_pairs'])
+    new_pairs = set(replayed_dict['blacklisted_pairs'])
+    if old_pairs == new_pairs:
+        return None
+    return {
+        "exchange": message_dict['exchange'],
+        "date": message_dict['date'],
+        "post_id": message_dict.get('post_id'),
+        "message": message_dict['message'],
+        "added": sorted(new_pairs - old_pairs),
+        "removed": sorted(old_pairs - new_pairs),
+    }
+
+
+def replay(source, output, exchanges, workers, page_cache_path):
+    store = bot.ProcessedStore(source)
+    stored_exchanges = [row[0] for row in store.connection.execute("SELECT DISTINCT exchange FROM processed")]
+    exchanges = [exchange for exchange in (exchanges or stored_exchanges) if exchange in stored_exchanges]
+    for exchange in list(exchanges):
+        if exchange not in SCRAPER_CLASSES:
+            logging.warning(f"{exchange}: there is no scraper for it, copying its messages unchanged")
+        elif bot.load_markets_snapshot(bot.get_markets_exchange(exchange)) is None:
+            logging.warning(f"{exchange}: no markets snapshot in {bot.StatVars.markets_snapshot_dir}/ "
+                            f"(start the bot once), copying its messages unchanged")
+        else:
+            continue
+        exchanges.remove(exchange)
+    unchanged_exchanges = [exchange for exchange in stored_exchanges if exchange not in exchanges]
+
+    new_store = bot.ProcessedStore(output)
+    summary = {exchange: {"messages": 0, "changed": 0, "added": 0, "removed": 0} for exchange in exchanges}
+    changes = []
+
+    def collect(chunk, future):
+        replayed = future.result()
+        new_store.add(replayed)
+        for message_dict, replayed_dict in zip(chunk, replayed):
+            exchange_summary = summary.get(message_dict['exchange'])
+            if exchange_summary is None:
+                continue
+            exchange_summary["messages"] += 1
+            diff = get_diff(message_dict, replayed_dict)
+            if diff is None:
+                continue
+            changes.append(diff)
+            exchange_summary["changed"] += 1
+            exchange_summary["added"] += len(diff["added"])
+            exchange_summary["removed"] += len(diff["removed"])
+        logging.info(f"replayed {sum(exchange_summary['messages'] for exchange_summary in summary.values())} "
+                     f"messages, {len(changes)} changed")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(page_cache_path, bot.StatVars.markets_snapshot_dir,
+                                       logging.getLogger().level)) as executor:
+        # only a few chunks per worker are in flight, collected in order so the new store keeps the old order
+        pending = deque()
+        for chunk in iter_chunks(store):
+            pending.append((chunk, executor.submit(replay_chunk, set(exchanges), chunk)))
+            if len(pending) >= 2 * workers:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+    new_store.close()
+    store.close()
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).strftime(bot.StatVars.datetimeFormat),
+            "source": str(source),
+            "output": str(output),
+            "unchanged_exchanges": unchanged_exchanges,
+        },
+        "summary": summary,
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-classify the stored announcements with the current rules "
+                                                 "into a new store and report the changed blacklisted pairs")
+    parser.add_argument("--source", default=bot.StatVars.path_processed_db)
+    parser.add_argument("--output", default="processed.replayed.sqlite", help="the new store, must not exist yet")
+    parser.add_argument("--report", default="replay_report.json", help="the diff report (json)")
+    parser.add_argument("--exchanges", nargs="*", help="default: every exchange in the store")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--page-cache", default=bot.StatVars.path_page_cache,
+                        help="cached announcement pages (kucoin), pages that aren't cached are skipped")
+    parser.add_argument("--markets", default=bot.StatVars.markets_snapshot_dir, help="markets snapshot directory")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    if not Path(args.source).exists():
+        sys.exit(f"{args.source} does not exist")
+    if Path(args.output).exists():
+        sys.exit(f"{args.output} exists already, remove it or choose another --output")
+    bot.StatVars.markets_snapshot_dir = args.markets
+
+    report = replay(args.source, args.output, args.exchanges, args.workers, args.page_cache)
+    Path(args.report).write_text(json.dumps(report, indent=4))
+    for exchange, exchange_summary in report["summary"].items():
+        print(f"{exchange}: {exchange_summary['messages']} messages, {exchange_summary['changed']} changed, "
+              f"{exchange_summary['added']} pairs added, {exchange_summary['removed']} pairs removed")
+    print(f"wrote {args.output} and {args.report}")
+
+
+if __name__ == "__main__":
+    main()
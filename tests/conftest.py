@@ -0,0 +1,111 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+MARKETS = {f"{base}/{quote}": {"id": f"{base}{quote}", "symbol": f"{base}/{quote}", "base": base, "quote": quote}
+           for base in ["ANT", "MULTI", "VAI", "XMR", "AUTO", "BTCST", "NBT", "PIXEL", "ATOM", "BTC", "ETH", "BNB",
+                        "AAA", "BBB"]
+           for quote in ["USDT", "BTC"]}
+
+
+class StubServer:
+    # local http server, routes map a path to handler(query, headers) -> (status, headers, body)
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                stub.requests.append((parts.path, dict(parse_qsl(parts.query)), dict(self.headers)))
+                route = stub.routes.get(parts.path)
+                if route is None:
+                    status, headers, body = 404, {}, b""
+                else:
+                    status, headers, body = route(dict(parse_qsl(parts.query)), self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TelegramStub:
+    # serves the recorded t.me/s/<channel> pages like telegram does: the 20 newest posts, or the 20 posts
+    # before ?before=<post id>, an empty history once there is nothing older
+    page_size = 20
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.bubbles = {}
+        scraper = bot.BinanceScraper()
+        for page_file in sorted((FIXTURES_DIR / "telegram" / channel).glob("*.html")):
+            fetcher = bot.HttpPageFetcher(session=False)
+            fetcher.new_pages = [page_file.read_text()]
+            for message_html in scraper.extract_new_messages(fetcher):
+                self.bubbles[scraper.extract_post_id(message_html)] = str(message_html)
+        self.post_ids = sorted(self.bubbles)
+
+    def __call__(self, query, headers):
+        before = int(query.get("before", self.post_ids[-1] + 1))
+        post_ids = [post_id for post_id in self.post_ids if post_id < before][-self.page_size:]
+        html_source = ('<html><body><section class="tgme_channel_history js-message_history">' +
+                       "".join(self.bubbles[post_id] for post_id in post_ids) + "</section></body></html>")
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, html_source.encode()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def telegram(stub_server):
+    stub = TelegramStub("binance_announcements")
+    stub_server.routes["/s/binance_announcements"] = stub
+    stub.url = stub_server.url("/s/binance_announcements")
+    return stub
+
+
+# every test gets its own store and working directory and starts without state of earlier tests
+@pytest.fixture(autouse=True)
+def bot_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot.StatVars, "processed_store", bot.ProcessedStore(str(tmp_path / "processed.sqlite")))
+    monkeypatch.setattr(bot.StatVars, "metrics", bot.Metrics())
+    monkeypatch.setattr(bot.StatVars, "blacklist_writer", bot.BlacklistWriter())
+    monkeypatch.setattr(bot.StatVars, "seen_post_ids", {})
+    monkeypatch.setattr(bot.StatVars, "http_validators", {})
+    monkeypatch.setattr(bot.StatVars, "symbol_indexes", {})
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [])
+    monkeypatch.setattr(bot.StatVars, "stage_log_file", None)
+    monkeypatch.setattr(bot.StatVars, "scrollUpSleepTime", 0)
+    yield
+    bot.StatVars.processed_store.close()
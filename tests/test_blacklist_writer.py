@@ -0,0 +1,47 @@
+import json
+
+import bot
+
+
+def get_message_dict(post_id, pairs):
+    return {"exchange": "binance", "date": f"2024-02-01T10:00:{post_id % 60:02d}+0000", "post_id": post_id,
+            "date_scraped": "2024-02-01T10:01:00+0000", "message": "Binance Will Delist", "linked_urls": [],
+            "blacklisted_pairs": pairs}
+
+
+def test_new_pairs_are_in_the_config_file_once_the_messages_are_processed(tmp_path, monkeypatch):
+    config_path = tmp_path / "blacklist.json"
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [
+        {"exchanges": ["binance"], "config_path": str(config_path), "ips": [], "new_pair_blacklist": []}])
+
+    bot.process_new_messages("binance", [get_message_dict(1, ["AAA/.*", "BBB/.*"])], fresh=False)
+
+    assert json.loads(config_path.read_text())["exchange"]["pair_blacklist"] == ["AAA/.*", "BBB/.*"]
+
+
+def test_a_failed_write_is_retried_with_the_next_flush(tmp_path):
+    config_path = tmp_path / "missing_directory" / "blacklist.json"
+    writer = bot.BlacklistWriter()
+    assert writer.add(str(config_path), ["AAA/.*"]) == ["AAA/.*"]
+
+    writer.flush()
+    assert writer.files[str(config_path)]["dirty"]
+
+    config_path.parent.mkdir()
+    writer.flush()
+    assert not writer.files[str(config_path)]["dirty"]
+    assert json.loads(config_path.read_text())["exchange"]["pair_blacklist"] == ["AAA/.*"]
+
+
+def test_fresh_messages_count_as_persisted_once_the_config_is_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [
+        {"exchanges": ["binance"], "config_path": str(tmp_path / "blacklist.json"), "ips": [],
+         "new_pair_blacklist": []}])
+    events = []
+    flush = bot.StatVars.blacklist_writer.flush
+    monkeypatch.setattr(bot.StatVars.blacklist_writer, "flush", lambda: events.append("flush") or flush())
+    monkeypatch.setattr(bot, "observe_timeline", lambda *args: events.append("observe_timeline"))
+
+    bot.process_new_messages("binance", [get_message_dict(1, ["AAA/.*"])], fresh=True)
+
+    assert events == ["flush", "observe_timeline"]
@@ -0,0 +1,72 @@
+import bot
+from conftest import MARKETS
+
+
+def get_post_ids(html_source):
+    return [int(post_id) for post_id in bot.HttpPageFetcher.post_id_pattern.findall(html_source)]
+
+
+def test_get_loads_the_newest_page(telegram):
+    fetcher = bot.HttpPageFetcher()
+    fetcher.get(telegram.url)
+
+    assert get_post_ids(fetcher.page_source) == telegram.post_ids[-20:]
+    assert fetcher.oldest_post_id == telegram.post_ids[-20]
+    assert fetcher.pop_new_html() == fetcher.page_source
+    assert fetcher.pop_new_html() == ""
+
+
+def test_scroll_up_pages_in_older_posts_before_the_oldest_one(telegram, stub_server):
+    fetcher = bot.HttpPageFetcher()
+    fetcher.get(telegram.url)
+    fetcher.pop_new_html()
+
+    assert fetcher.scroll_up()
+    assert stub_server.requests[-1][1] == {"before": str(telegram.post_ids[-20])}
+    assert get_post_ids(fetcher.pop_new_html()) == telegram.post_ids[-40:-20]
+
+    # pages loaded since the last pop come oldest first, like the bubbles in the browser
+    assert fetcher.scroll_up()
+    fetcher.get(telegram.url)
+    assert fetcher.scroll_up()
+    assert get_post_ids(fetcher.pop_new_html()) == telegram.post_ids[-40:]
+
+
+def test_scroll_up_stops_at_the_end_of_the_history(telegram):
+    fetcher = bot.HttpPageFetcher()
+    fetcher.get(telegram.url)
+    scrolls = 0
+    while fetcher.scroll_up():
+        scrolls += 1
+
+    assert scrolls == 2
+    assert fetcher.oldest_post_id == telegram.post_ids[0]
+    assert get_post_ids(fetcher.pop_new_html()) == telegram.post_ids
+
+
+def test_scrape_reads_the_whole_channel_then_only_new_posts(telegram, monkeypatch):
+    monkeypatch.setattr(bot.BinanceScraper, "url", telegram.url)
+    fetcher = bot.HttpPageFetcher()
+
+    bot.BinanceScraper().scrape(MARKETS, fetcher)
+    store = bot.StatVars.processed_store
+    # every post with text, the photo without text doesn't get stored
+    assert store.count("binance") == len(telegram.post_ids) - 1
+    assert store.get_newest_post_id("binance") == telegram.post_ids[-1]
+    delisted = {tuple(message_dict["blacklisted_pairs"]) for message_dict in store.iter_messages("binance")}
+    assert tuple(sorted(["ANT/.*", "MULTI/.*", "VAI/.*", "XMR/.*"])) in {tuple(sorted(pairs)) for pairs in delisted}
+
+    # nothing new: the page gets loaded, nothing gets parsed
+    bot.BinanceScraper().scrape(MARKETS, fetcher)
+    assert bot.StatVars.metrics.counters[("delist_unchanged_polls_total", (("exchange", "binance"),))] == 1
+
+
+def test_backfill_walks_the_history_down_to_the_first_post(telegram, monkeypatch):
+    monkeypatch.setattr(bot.BinanceScraper, "url", telegram.url)
+    monkeypatch.setattr(bot.StatVars, "backfill_batch_scrolls", 1)
+
+    bot.BinanceScraper().backfill(MARKETS, bot.HttpPageFetcher())
+
+    store = bot.StatVars.processed_store
+    assert store.count("binance") == len(telegram.post_ids) - 1
+    assert store.get_oldest_post_id("binance") == telegram.post_ids[0]
@@ -0,0 +1,117 @@
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import bot
+from conftest import FIXTURES_DIR, MARKETS
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "http_port", 0)
+    monkeypatch.setattr(bot.StatVars, "ingest_token", "s3cret")
+    monkeypatch.setattr(bot.StatVars, "exchanges_pairs", {"binance": MARKETS})
+    notified = []
+    monkeypatch.setattr(bot, "notify_bots", lambda force_orders, timeline=None, announcements=None:
+                        notified.append((force_orders, sorted(announcements))))
+    server = bot.start_http_server()
+    server.notified = notified
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body, token="s3cret"):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/ingest", data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as ex:
+        return ex.code, None
+
+
+def read_fixture(name):
+    return (FIXTURES_DIR / "ingest" / name).read_bytes()
+
+
+def get_message_dicts():
+    return {message_dict["post_id"]: message_dict
+            for message_dict in bot.StatVars.processed_store.iter_messages("binance")}
+
+
+def test_pushed_announcements_get_blacklisted_once(ingest, monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [
+        {"exchanges": ["binance"], "config_path": "blacklist.json", "ips": [], "new_pair_blacklist": []}])
+
+    status, result = post(ingest, read_fixture("announcements.json"))
+    assert status == 200
+    assert result == {"accepted": 2, "duplicates": 0,
+                      "blacklisted_pairs": ["ANT/.*", "MULTI/.*", "VAI/.*", "XMR/.*"]}
+    assert ingest.notified == [(True, ["ANT/.*", "MULTI/.*", "VAI/.*", "XMR/.*"])]
+    assert get_message_dicts()[1053]["source"] == "push"
+
+    status, result = post(ingest, read_fixture("announcements.json"))
+    assert (status, result["accepted"], result["duplicates"]) == (200, 0, 2)
+
+
+def test_an_old_announcement_only_gets_blacklisted(ingest, monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [
+        {"exchanges": ["binance"], "config_path": "blacklist.json", "ips": [], "new_pair_blacklist": []}])
+
+    status, result = post(ingest, read_fixture("backlog.json"))
+    assert (status, result["accepted"]) == (200, 1)
+    assert ingest.notified == [(False, ["AUTO/.*", "BTCST/.*", "NBT/.*"])]
+
+
+def test_bad_requests_are_rejected(ingest, monkeypatch):
+    assert post(ingest, read_fixture("announcements.json"), token="wrong")[0] == 401
+    assert post(ingest, read_fixture("announcements.json"), token=None)[0] == 401
+    assert post(ingest, b'{"exchange": "nope", "message": "x"}')[0] == 400
+    assert post(ingest, b'{"exchange": "binance"}')[0] == 400
+    assert post(ingest, b"not json")[0] == 400
+
+    monkeypatch.setattr(bot.StatVars, "exchanges_pairs", {})
+    assert post(ingest, b'{"exchange": "binance", "message": "x"}')[0] == 503
+
+    monkeypatch.setattr(bot.StatVars, "ingest_max_bytes", 10)
+    assert post(ingest, read_fixture("announcements.json"))[0] == 413
+    assert get_message_dicts() == {}
+
+
+@pytest.mark.parametrize("content_length", ["-1", "abc"])
+def test_an_invalid_content_length_is_rejected_without_reading(ingest, content_length):
+    connection = http.client.HTTPConnection("127.0.0.1", ingest.server_port, timeout=5)
+    connection.putrequest("POST", "/ingest")
+    connection.putheader("Authorization", "Bearer s3cret")
+    connection.putheader("Content-Length", content_length)
+    connection.endheaders()
+    assert connection.getresponse().status == 400
+    connection.close()
+
+
+def test_announcements_are_classified_without_the_process_lock(monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "exchanges_pairs", {"binance": MARKETS})
+    read_message = bot.BinanceScraper.read_message
+    lock_was_free = []
+
+    def read_message_checking_the_lock(self, message_dict):
+        # a scraper thread could take the lock meanwhile
+        def take_the_lock():
+            lock_was_free.append(bot.StatVars.process_lock.acquire(timeout=0))
+            if lock_was_free[-1]:
+                bot.StatVars.process_lock.release()
+        thread = threading.Thread(target=take_the_lock)
+        thread.start()
+        thread.join()
+        return read_message(self, message_dict)
+    monkeypatch.setattr(bot.BinanceScraper, "read_message", read_message_checking_the_lock)
+
+    result = bot.ingest_announcements(json.loads(read_fixture("announcements.json")))
+
+    assert result["accepted"] == 2
+    assert lock_was_free == [True, True]
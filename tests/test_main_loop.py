@@ -0,0 +1,60 @@
+import pytest
+
+import bot
+
+
+class StopLoop(BaseException):
+    pass
+
+
+class FakeScheduler:
+    # stops main() after a few ticks
+    def __init__(self, exchanges):
+        self.runs = 0
+
+    def run_pending(self, exchanges_pairs):
+        self.runs += 1
+        if self.runs == 3:
+            raise StopLoop()
+        return 0
+
+    def seconds_until_next_run(self):
+        return 0
+
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def main_loop(monkeypatch):
+    schedulers = []
+
+    def get_scheduler(exchanges):
+        schedulers.append(FakeScheduler(exchanges))
+        return schedulers[-1]
+    monkeypatch.setattr(bot.os, "nice", lambda increment: 0)
+    for name in ("open_processed", "load_bots_data", "open_coordinator", "install_profile_signal", "check_all_bots",
+                 "start_markets_refresher", "close_coordinator"):
+        monkeypatch.setattr(bot, name, lambda *args: None)
+    monkeypatch.setattr(bot, "get_exchanges_from_bot_groups", lambda: [])
+    monkeypatch.setattr(bot, "ScrapeScheduler", get_scheduler)
+    monkeypatch.setattr(bot.StatVars, "error_sleep_secs", 0)
+    monkeypatch.setattr(bot.StatVars, "metrics_file_secs", 0)
+
+    def run():
+        with pytest.raises(StopLoop):
+            bot.main()
+        return schedulers[0].runs
+    return run
+
+
+def test_an_unwritable_metrics_file_does_not_stop_the_scraping(main_loop, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "metrics_file", str(tmp_path / "missing_directory" / "metrics.prom"))
+    assert main_loop() == 3
+
+
+def test_a_failing_profile_request_does_not_stop_the_scraping(main_loop, monkeypatch):
+    def fail():
+        raise PermissionError("profile.request")
+    monkeypatch.setattr(bot, "check_profile_request", fail)
+    assert main_loop() == 3
@@ -0,0 +1,51 @@
+import pytest
+
+import bot
+from conftest import FIXTURES_DIR
+
+PAGE_URL = "https://www.kucoin.com/announcement/en-kucoin-will-delist-certain-projects-20240219"
+
+
+class FakeBrowser:
+    # stands in for a firefox driver, serves the recorded announcement page
+    def __init__(self):
+        self.urls = []
+        self.page_source = None
+
+    def get(self, url):
+        self.urls.append(url)
+        self.page_source = (FIXTURES_DIR / "kucoin" / "delist_certain_projects.html").read_text()
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def driver_pool(monkeypatch):
+    browsers = []
+
+    def factory():
+        browsers.append(FakeBrowser())
+        return browsers[-1]
+    pool = bot.DriverPool(factory, 1, 100)
+    pool.browsers = browsers
+    monkeypatch.setattr(bot.StatVars, "driver_pool", pool)
+    monkeypatch.setattr(bot.StatVars, "page_cache", None)
+    return pool
+
+
+def test_a_browser_scrape_reads_announcement_pages_with_its_own_browser(driver_pool):
+    scraper = bot.KucoinScraper()
+    with driver_pool.lease(timeout=1) as driver:
+        scraper.driver = driver
+        # with max_drivers = 1 a second lease would time out
+        assert scraper.read_message_of_news([PAGE_URL]) == "KEY OAX UNFI WRX"
+    assert driver_pool.browsers[0].urls == [PAGE_URL]
+
+
+def test_an_http_scrape_leases_a_browser_for_announcement_pages(driver_pool):
+    scraper = bot.KucoinScraper()
+    scraper.driver = bot.HttpPageFetcher()
+    assert scraper.read_message_of_news([PAGE_URL + "#delist"]) == "KEY OAX UNFI WRX"
+    assert driver_pool.browsers[0].urls == [PAGE_URL]
+    assert driver_pool.idle == driver_pool.browsers
@@ -0,0 +1,83 @@
+import requests
+
+import bot
+
+
+class FakeBot:
+    # answers like freqtrade's rest api, forceexit times out
+    def __init__(self):
+        self.calls = []
+
+    def status(self):
+        return [{"pair": "AAA/USDT", "is_short": False, "trade_id": 7}]
+
+    def forceexit(self, trade_id):
+        self.calls.append(("forceexit", trade_id))
+        raise requests.ReadTimeout("read timed out")
+
+    def blacklist(self, *pairs):
+        self.calls.append(("blacklist",) + pairs)
+        return {"blacklist": list(pairs)}
+
+    def forceenter(self, pair, side):
+        self.calls.append(("forceenter", pair, side))
+        return {"trade_id": 8}
+
+
+def test_a_failing_action_does_not_skip_the_others(tmp_path, monkeypatch):
+    fake_bot = FakeBot()
+    monkeypatch.setattr(bot, "get_bot_client", lambda bot_group, ip: fake_bot)
+    coordinator = bot.Coordinator(str(tmp_path / "coordination.sqlite"), "node-a", 60)
+    monkeypatch.setattr(bot.StatVars, "coordinator", coordinator)
+    bot_group = {"new_pair_blacklist": ["AAA/USDT"], "force_exit_long": True, "force_enter_short": True}
+    announcements = {"AAA/USDT": "binance/1"}
+
+    latencies = bot.notify_bot(bot_group, "127.0.0.1:8080", True, announcements=announcements)
+
+    assert fake_bot.calls == [("forceexit", 7), ("blacklist",), ("blacklist", "AAA/USDT"),
+                              ("forceenter", "AAA/USDT", "short")]
+    assert "forceexit AAA/USDT" in latencies
+    # the failed forceexit was released for the next try, the others stay claimed
+    assert coordinator.claim("binance/1", "127.0.0.1:8080", "forceexit AAA/USDT")
+    assert not coordinator.claim("binance/1", "127.0.0.1:8080", "forceenter AAA/USDT")
+    coordinator.close()
+
+
+class ErrorBodyBot(FakeBot):
+    # the blacklist GET answers with an error body instead of the blacklist
+    def forceexit(self, trade_id):
+        self.calls.append(("forceexit", trade_id))
+        return {"result": "ok"}
+
+    def blacklist(self, *pairs):
+        self.calls.append(("blacklist",) + pairs)
+        return {"detail": "Unauthorized"}
+
+
+def test_an_error_body_for_the_blacklist_still_sends_the_force_enters(monkeypatch):
+    fake_bot = ErrorBodyBot()
+    monkeypatch.setattr(bot, "get_bot_client", lambda bot_group, ip: fake_bot)
+    bot_group = {"new_pair_blacklist": ["AAA/USDT"], "force_exit_long": True, "force_enter_short": True}
+
+    bot.notify_bot(bot_group, "127.0.0.1:8080", True)
+
+    assert fake_bot.calls == [("forceexit", 7), ("blacklist",), ("forceenter", "AAA/USDT", "short")]
+    assert bot.StatVars.metrics.counters[
+        ("delist_bot_call_errors_total", (("action", "get blacklist"), ("bot", "127.0.0.1:8080")))] == 1
+
+
+def test_two_sources_of_one_delisting_force_enter_once_across_nodes(tmp_path, monkeypatch):
+    path = str(tmp_path / "coordination.sqlite")
+    bot_group = {"new_pair_blacklist": ["AAA/USDT"], "force_exit_long": False, "force_enter_short": True}
+    fake_bots = []
+    # the telegram post on one node, the website article on the other one
+    for node_id, announcement in (("node-a", "binance/1052"), ("node-b", "binance_web/218900")):
+        fake_bots.append(ErrorBodyBot())
+        monkeypatch.setattr(bot, "get_bot_client", lambda bot_group, ip: fake_bots[-1])
+        coordinator = bot.Coordinator(path, node_id, 60)
+        monkeypatch.setattr(bot.StatVars, "coordinator", coordinator)
+        bot.notify_bot(bot_group, "127.0.0.1:8080", True, announcements={"AAA/USDT": announcement})
+        coordinator.close()
+
+    assert [call for fake_bot in fake_bots for call in fake_bot.calls if call[0] == "forceenter"] == [
+        ("forceenter", "AAA/USDT", "short")]
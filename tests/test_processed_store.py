@@ -0,0 +1,81 @@
+import sqlite3
+
+import bot
+from conftest import MARKETS
+
+
+def test_a_pushed_post_does_not_hide_the_posts_before_it(telegram, monkeypatch):
+    monkeypatch.setattr(bot.BinanceScraper, "url", telegram.url)
+    monkeypatch.setattr(bot.StatVars, "exchanges_pairs", {"binance": MARKETS})
+    store = bot.StatVars.processed_store
+    fetcher = bot.HttpPageFetcher()
+    newest_post_ids = telegram.post_ids[-2:]
+    telegram.post_ids = telegram.post_ids[:-2]
+    bot.BinanceScraper().scrape(MARKETS, fetcher)
+
+    # the forwarder pushes the newest post before the poller saw the one before it
+    telegram.post_ids += newest_post_ids
+    bot.ingest_announcements([{"exchange": "binance", "message": "Binance Will Delist AAA on 2024-03-01",
+                               "date": "2024-02-16T10:00:00+0000", "post_id": newest_post_ids[1]}])
+    assert store.get_newest_post_id("binance") == newest_post_ids[0] - 1
+
+    bot.BinanceScraper().scrape(MARKETS, fetcher)
+    assert store.contains("binance", "", newest_post_ids[0])
+    assert store.get_newest_post_id("binance") == newest_post_ids[0]
+    # the pushed one stays as it was pushed
+    pushed = [message_dict for message_dict in store.iter_messages("binance")
+              if message_dict["post_id"] == newest_post_ids[1]]
+    assert [(message_dict["source"], message_dict["blacklisted_pairs"]) for message_dict in pushed] == \
+           [("push", ["AAA/.*"])]
+
+
+def test_a_pushed_id_of_another_numbering_does_not_blind_the_poller(telegram, monkeypatch):
+    monkeypatch.setattr(bot.BinanceScraper, "url", telegram.url)
+    monkeypatch.setattr(bot.StatVars, "exchanges_pairs", {"binance": MARKETS})
+    bot.ingest_announcements([{"exchange": "binance", "message": "Binance Will Delist AAA on 2024-03-01",
+                               "post_id": 987654321}])
+
+    bot.BinanceScraper().scrape(MARKETS, bot.HttpPageFetcher())
+    assert bot.StatVars.processed_store.count("binance") == len(telegram.post_ids)
+
+
+def test_schema_2_gets_a_source_column(tmp_path):
+    path = str(tmp_path / "v2.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE processed (id INTEGER PRIMARY KEY AUTOINCREMENT, exchange TEXT NOT NULL, "
+                       "date TEXT NOT NULL, post_id INTEGER, date_scraped TEXT, message TEXT, linked_urls TEXT, "
+                       "blacklisted_pairs TEXT)")
+    connection.execute("INSERT INTO processed (exchange, date, post_id, message) "
+                       "VALUES ('binance', '2024-01-01T00:00:00+0000', 5, 'm')")
+    connection.execute("PRAGMA user_version = 2")
+    connection.commit()
+    connection.close()
+
+    store = bot.ProcessedStore(path)
+    assert store.connection.execute("PRAGMA user_version").fetchone()[0] == bot.ProcessedStore.schema_version
+    assert [message_dict["source"] for message_dict in store.iter_messages()] == [None]
+    assert store.get_newest_post_id("binance") == 5
+    assert store.contains("binance", "", 5, scraped_only=True)
+    store.close()
+
+
+def test_iter_messages_releases_the_lock_between_chunks(tmp_path):
+    store = bot.ProcessedStore(str(tmp_path / "chunks.sqlite"))
+    store.add([{"exchange": exchange, "date": f"2024-01-0{day}T00:00:00+0000", "post_id": post_id}
+               for post_id, (exchange, day) in enumerate([("okx", 1), ("binance", 2), ("binance", 1),
+                                                          ("okx", 2), ("binance", 3)])])
+    store.add([{"exchange": "binance", "date": "2024-01-01T00:00:00+0000"}])
+
+    messages = store.iter_messages(chunk_size=2)
+    first = next(messages)
+    # the bot keeps saving while an export streams
+    assert store.lock.acquire(blocking=False)
+    store.lock.release()
+    keys = [(first["exchange"], first["date"], first["post_id"])] + [
+        (message_dict["exchange"], message_dict["date"], message_dict["post_id"]) for message_dict in messages]
+    assert keys == [("binance", "2024-01-01T00:00:00+0000", None), ("binance", "2024-01-01T00:00:00+0000", 2),
+                    ("binance", "2024-01-02T00:00:00+0000", 1), ("binance", "2024-01-03T00:00:00+0000", 4),
+                    ("okx", "2024-01-01T00:00:00+0000", 0), ("okx", "2024-01-02T00:00:00+0000", 3)]
+    assert [message_dict["post_id"] for message_dict in store.iter_messages(by_id=True, chunk_size=2)] == [
+        0, 1, 2, 3, 4, None]
+    store.close()
@@ -0,0 +1,39 @@
+import os
+import signal
+import tracemalloc
+
+import pytest
+
+import bot
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="no SIGUSR1 on this platform")
+def test_sigusr1_while_the_profiler_lock_is_held(monkeypatch):
+    profiler = bot.LoopProfiler()
+    monkeypatch.setattr(bot.StatVars, "profiler", profiler)
+    monkeypatch.setattr(bot.StatVars, "profile_control_file", "profile.request")
+    previous_handler = signal.getsignal(signal.SIGUSR1)
+    bot.install_profile_signal()
+    try:
+        with profiler.lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+        assert profiler.loops_left == 0
+
+        bot.check_profile_request()
+        assert profiler.loops_left == bot.StatVars.profile_loops
+        assert not bot.StatVars.profile_signaled.is_set()
+    finally:
+        signal.signal(signal.SIGUSR1, previous_handler)
+        bot.StatVars.profile_signaled.clear()
+        tracemalloc.stop()
+
+
+def test_the_stage_records_follow_their_size_setting(monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "stage_records", None)
+    monkeypatch.setattr(bot.StatVars, "stage_log_file", None)
+    for index in range(3):
+        bot.write_stage_record("binance", {"parse": (0.1, 1)}, index)
+    monkeypatch.setattr(bot.StatVars, "stage_records_size", 2)
+    bot.write_stage_record("binance", {"parse": (0.1, 1)}, 3)
+
+    assert [record["seconds"] for record in bot.get_stage_records()] == [2, 3]
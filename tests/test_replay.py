@@ -0,0 +1,34 @@
+import bot
+import replay
+from conftest import MARKETS
+
+
+def get_message_dict(exchange, post_id, message, pairs):
+    return {"exchange": exchange, "date": f"2024-02-0{post_id % 9 + 1}T10:00:00+0000", "post_id": post_id,
+            "date_scraped": "2024-02-10T10:00:00+0000", "message": message, "linked_urls": [],
+            "blacklisted_pairs": pairs}
+
+
+def test_the_replayed_store_keeps_the_stored_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "markets_snapshot_dir", str(tmp_path / "markets"))
+    bot.save_markets_snapshot("binance", MARKETS)
+    source = tmp_path / "source.sqlite"
+    store = bot.ProcessedStore(str(source))
+    # stored in the order they were scraped, not sorted by exchange or date
+    message_dicts = [get_message_dict("okx", 7, "OKX to delist BBB", ["BBB/.*"]),
+                     get_message_dict("binance", 3, "Binance Will Delist AAA", []),
+                     get_message_dict("binance", 1, "Binance Will Delist ANT", ["ANT/.*"])]
+    for message_dict in message_dicts:
+        store.add([message_dict])
+    store.close()
+
+    report = replay.replay(str(source), str(tmp_path / "replayed.sqlite"), None, 1, str(tmp_path / "pages.sqlite"))
+
+    assert report["meta"]["unchanged_exchanges"] == ["okx"]
+    assert report["summary"] == {"binance": {"messages": 2, "changed": 1, "added": 1, "removed": 0}}
+    assert [(change["post_id"], change["added"]) for change in report["changes"]] == [(3, ["AAA/.*"])]
+    replayed = bot.ProcessedStore(str(tmp_path / "replayed.sqlite"))
+    assert [(message_dict["exchange"], message_dict["post_id"], message_dict["blacklisted_pairs"])
+            for message_dict in replayed.iter_messages(by_id=True)] == [
+        ("okx", 7, ["BBB/.*"]), ("binance", 3, ["AAA/.*"]), ("binance", 1, ["ANT/.*"])]
+    replayed.close()
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+import bot
+
+
+def add_messages(exchange, *ages):
+    now = datetime.now(timezone.utc)
+    bot.StatVars.processed_store.add([
+        {"exchange": exchange, "date": (now - age).strftime(bot.StatVars.datetimeFormat), "post_id": post_id,
+         "message": "Binance Will List", "blacklisted_pairs": []}
+        for post_id, age in enumerate(ages, bot.StatVars.processed_store.count(exchange))])
+
+
+def test_a_new_store_polls_at_the_base_interval():
+    job = bot.ScrapeJob("okx", bot.OkxScraper)
+    assert job.get_loop_secs() == bot.StatVars.loop_secs
+    assert job.posts_per_day is None
+
+
+def test_a_store_reaching_back_a_day_polls_a_quiet_channel_less_often():
+    add_messages("okx", timedelta(minutes=5))
+    assert bot.ScrapeJob("okx", bot.OkxScraper).get_loop_secs() == bot.StatVars.loop_secs
+
+    add_messages("okx", timedelta(days=3))
+    job = bot.ScrapeJob("okx", bot.OkxScraper)
+    assert job.get_loop_secs() == bot.StatVars.max_loop_secs
+    assert round(job.posts_per_day, 2) == round(2 / 3, 2)
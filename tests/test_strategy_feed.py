@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("freqtrade")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from delist_shorter_strategy import DelistEventFeed  # noqa: E402
+
+
+def write_records(path, records):
+    # the order of ProcessedStore.export_json: by exchange, then date
+    path.write_text(json.dumps(sorted(records, key=lambda record: (record["exchange"], record["date"]))))
+    # a second write within the mtime resolution must still count as a change
+    os.utime(path, ns=(os.stat(path).st_mtime_ns, os.stat(path).st_mtime_ns + 1000))
+
+
+def record(exchange, date, pairs):
+    return {"exchange": exchange, "date": date, "date_scraped": date, "message": f"delist {pairs}",
+            "linked_urls": [], "blacklisted_pairs": pairs}
+
+
+@pytest.fixture
+def strategies_dir(tmp_path):
+    # without a processed.sqlite next to it, the feed falls back to processed.json
+    path = tmp_path / "user_data" / "strategies"
+    path.mkdir(parents=True)
+    return path
+
+
+def test_json_feed_reads_new_records_wherever_they_land(strategies_dir):
+    json_path = strategies_dir / "processed.json"
+    records = [record("binance", "2024-01-01T10:00:00+0000", ["AAA/.*"]),
+               record("okx", "2024-01-02T10:00:00+0000", ["BBB/.*"])]
+    write_records(json_path, records)
+    feed = DelistEventFeed(strategies_dir)
+    assert feed.refresh() == 2
+    assert len(feed.get_pair_dates("BBB/USDT")) == 1
+
+    # sorted in front of the okx record
+    records.append(record("binance", "2024-01-03T10:00:00+0000", ["CCC/.*"]))
+    write_records(json_path, records)
+    assert feed.refresh() == 1
+    assert len(feed.get_pair_dates("CCC/USDT")) == 1
+    assert len(feed.pattern_dates["BBB/.*"]) == 1
+    assert len(feed.get_pair_dates("BBB/USDT")) == 1
+
+    # unchanged file
+    assert feed.refresh() == 0
+
+
+def test_json_feed_starts_over_when_records_change(strategies_dir):
+    json_path = strategies_dir / "processed.json"
+    write_records(json_path, [record("binance", "2024-01-01T10:00:00+0000", ["AAA/.*"])])
+    feed = DelistEventFeed(strategies_dir)
+    feed.refresh()
+    assert len(feed.get_pair_dates("AAA/USDT")) == 1
+
+    write_records(json_path, [record("binance", "2024-01-01T10:00:00+0000", ["DDD/.*"])])
+    assert feed.refresh() == 1
+    assert len(feed.get_pair_dates("AAA/USDT")) == 0
+    assert len(feed.get_pair_dates("DDD/USDT")) == 1
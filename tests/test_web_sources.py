@@ -0,0 +1,142 @@
+import hashlib
+import json
+import time
+
+import pytest
+
+import bot
+from conftest import FIXTURES_DIR, MARKETS
+
+
+class ArticleListStub:
+    # serves an announcement list, with an ETag (answering If-None-Match with a 304) unless send_etag is off
+    def __init__(self, fixture):
+        self.data = json.loads((FIXTURES_DIR / "web" / fixture).read_text())
+        self.send_etag = True
+        self.statuses = []
+
+    def __call__(self, query, headers):
+        body = json.dumps(self.data).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.send_etag and headers.get("If-None-Match") == etag:
+            self.statuses.append(304)
+            return 304, {}, b""
+        self.statuses.append(200)
+        return 200, {"Content-Type": "application/json", **({"ETag": etag} if self.send_etag else {})}, body
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    monkeypatch.setattr(bot.StatVars, "bot_groups", [
+        {"exchanges": ["binance", "kucoin"], "config_path": "blacklist.json", "ips": [], "new_pair_blacklist": []}])
+    calls = []
+    monkeypatch.setattr(bot, "notify_bots", lambda force_orders, timeline=None, announcements=None:
+                        calls.append((force_orders, sorted(announcements))))
+    return calls
+
+
+@pytest.fixture
+def binance_web(stub_server, monkeypatch):
+    stub = ArticleListStub("binance_delisting.json")
+    stub_server.routes["/bapi/composite/v1/public/cms/article/list/query"] = stub
+    monkeypatch.setattr(bot.BinanceScraperWeb, "api_url",
+                        stub_server.url("/bapi/composite/v1/public/cms/article/list/query"))
+    return stub
+
+
+def get_unchanged_polls(exchange):
+    return bot.StatVars.metrics.counters.get(("delist_unchanged_polls_total", (("exchange", exchange),)), 0)
+
+
+def test_binance_articles_become_messages(binance_web, notified):
+    bot.BinanceScraperWeb().scrape(MARKETS)
+
+    message_dicts = {message_dict["post_id"]: message_dict
+                     for message_dict in bot.StatVars.processed_store.iter_messages("binance_web")}
+    assert sorted(message_dicts) == [218701, 218746, 218812]
+    message_dict = message_dicts[218746]
+    assert message_dict["date"] == "2024-02-09T03:00:00+0000"
+    assert message_dict["message"] == "Binance Will Delist ANT, MULTI, VAI, XMR on 2024-02-20"
+    assert message_dict["linked_urls"] == [
+        "https://www.binance.com/en/support/announcement/0f2e0b4b2f5b4c0d9d63b0e5d8f0a1c2"]
+    assert sorted(message_dict["blacklisted_pairs"]) == ["ANT/.*", "MULTI/.*", "VAI/.*", "XMR/.*"]
+    # the first poll only gathers, and both sources blacklist into the config of the exchange
+    assert notified == [(False, ["ANT/.*", "AUTO/.*", "BTCST/.*", "MULTI/.*", "NBT/.*", "VAI/.*", "XMR/.*"])]
+
+
+def test_an_unchanged_list_costs_a_304(binance_web, stub_server, notified):
+    bot.BinanceScraperWeb().scrape(MARKETS)
+    bot.BinanceScraperWeb().scrape(MARKETS)
+
+    assert binance_web.statuses == [200, 304]
+    assert stub_server.requests[-1][2]["If-None-Match"].startswith('"')
+    assert get_unchanged_polls("binance_web") == 1
+    assert len(notified) == 1
+
+
+def test_an_unchanged_body_without_validators_is_skipped(binance_web, notified, monkeypatch):
+    binance_web.send_etag = False
+    bot.BinanceScraperWeb().scrape(MARKETS)
+    read_message_calls = []
+    monkeypatch.setattr(bot.BinanceScraperWeb, "read_message",
+                        lambda self, message_dict: read_message_calls.append(message_dict))
+    bot.BinanceScraperWeb().scrape(MARKETS)
+
+    assert binance_web.statuses == [200, 200]
+    assert get_unchanged_polls("binance_web") == 1
+    assert read_message_calls == []
+
+
+def test_later_polls_force_orders_on_fresh_articles_only(binance_web, notified):
+    bot.BinanceScraperWeb().scrape(MARKETS)
+    articles = binance_web.data["data"]["catalogs"][0]["articles"]
+    articles.insert(0, {"id": 218900, "code": "fresh", "title": "Binance Will Delist AAA on 2024-04-01", "type": 1,
+                        "releaseDate": int(time.time() * 1000)})
+    articles.append({"id": 218600, "code": "late", "title": "Binance Will Delist BBB on 2024-01-20", "type": 1,
+                     "releaseDate": 1704067200000})
+    bot.BinanceScraperWeb().scrape(MARKETS)
+
+    assert notified[1:] == [(False, ["BBB/.*"]), (True, ["AAA/.*"])]
+
+
+def test_a_failed_run_fetches_the_list_again(binance_web, notified, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(bot, "process_new_messages", fail)
+    with pytest.raises(RuntimeError):
+        bot.BinanceScraperWeb().scrape(MARKETS)
+
+    assert bot.StatVars.http_validators == {}
+
+
+def test_kucoin_articles_link_their_announcement_page(stub_server, notified, monkeypatch):
+    stub = ArticleListStub("kucoin_delistings.json")
+    stub_server.routes["/_api/cms/articles"] = stub
+    monkeypatch.setattr(bot.KucoinScraperWeb, "api_url", stub_server.url("/_api/cms/articles"))
+    monkeypatch.setattr(bot.StatVars, "page_cache", None)
+    page_url = "https://www.kucoin.com/announcement/en-kucoin-will-delist-certain-projects-20240219"
+    bot.get_page_cache().put(page_url, "<html></html>", ["XMR", "VAI"], True)
+
+    bot.KucoinScraperWeb().scrape(MARKETS)
+
+    message_dicts = {message_dict["post_id"]: message_dict
+                     for message_dict in bot.StatVars.processed_store.iter_messages("kucoin_web")}
+    assert message_dicts[13563]["date"] == "2024-02-19T08:00:00+0000"
+    assert message_dicts[13563]["message"] == ("KuCoin Will Delist Certain Projects _-_ "
+                                               "KuCoin will delist the following projects on 2024-02-26.")
+    assert message_dicts[13563]["linked_urls"] == [page_url]
+    assert sorted(message_dicts[13563]["blacklisted_pairs"]) == ["VAI/.*", "XMR/.*"]
+    assert message_dicts[13498]["blacklisted_pairs"] == ["ANT/.*"]
+    assert stub_server.requests[0][1] == {"page": "1", "pageSize": "20", "category": "delistings", "lang": "en_US"}
+
+
+def test_web_jobs_are_only_scheduled_when_enabled(monkeypatch):
+    scheduler = bot.ScrapeScheduler(["binance", "kucoin"])
+    assert [job.exchange for job in scheduler.jobs] == ["binance", "kucoin"]
+    scheduler.shutdown()
+
+    monkeypatch.setattr(bot.StatVars, "web_sources", ["binance"])
+    scheduler = bot.ScrapeScheduler(["binance", "kucoin"])
+    assert [(job.exchange, job.markets_exchange) for job in scheduler.jobs] == [
+        ("binance", "binance"), ("kucoin", "kucoin"), ("binance_web", "binance")]
+    scheduler.shutdown()